@@ -0,0 +1,81 @@
+# coding: utf-8
+"""
+返回值编码基准测试
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+测量api_return和static_api_return的吞吐量，对比原实现（每次查找返回码表、用JsonEncoder类编码）以及json、orjson两种编码
+
+    python bench/bench_api_return.py [--ops 20000]
+"""
+import os
+import sys
+import json
+import decimal
+import argparse
+from datetime import date, datetime
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, Response, current_app, g, request     # noqa: E402
+
+from src.api import COMMON_RESPONSE_CODE_LIST, api, api_return, static_api_return     # noqa: E402
+from src.response import JsonEncoder    # noqa: E402
+
+
+def legacy_api_return(code, msg=None, data=None, **kwargs):
+    """原实现"""
+    code = str(code).upper()
+    response_codes = getattr(current_app.blueprints.get(request.blueprint, current_app), "COMMON_RESPONSE_CODE_LIST", COMMON_RESPONSE_CODE_LIST)
+    if code not in response_codes.keys():
+        code = "ERR"
+    g.api_code = code
+    if msg is None:
+        msg = response_codes[code][1]
+    if data is None:
+        data = ""
+    result = {"code": response_codes[code][0], "msg": msg, "data": data}
+    result.update(kwargs)
+    return Response(json.dumps(result, cls=JsonEncoder, separators=(",", ":")), mimetype="application/json")
+
+
+ROW = {
+    "id": 1, "account": "13800000000", "nickname": "测试", "birthday": date(1990, 1, 2),
+    "create_time": datetime(2024, 1, 2, 3, 4, 5), "amount": decimal.Decimal("1.5"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=20000)
+    args = parser.parse_args()
+
+    app = Flask("bench")
+    app.register_blueprint(api)
+    cases = [
+        ("token error", lambda f, static: static("TOKEN_INVALID", "登录凭证已失效")),
+        ("param error", lambda f, static: static("PARAM_ERROR", "参数错误：account", {"field": "account"})),
+        ("one row", lambda f, static: f("OK", data=ROW)),
+        ("50 rows", lambda f, static: f("OK", data=[ROW] * 50)),
+    ]
+    modes = [
+        ("legacy", "json", legacy_api_return, legacy_api_return),
+        ("json", "json", api_return, static_api_return),
+        ("orjson", "orjson", api_return, static_api_return),
+    ]
+    print(f"{'case':12s}" + "".join(f"{name:>12s}" for name, *_ in modes) + "   (us/call)")
+    with app.test_request_context("/api/login/"):
+        for case, call in cases:
+            ops = args.ops if case != "50 rows" else args.ops // 10
+            row = []
+            for _, encoder, func, static in modes:
+                app.config["RESPONSE_JSON_ENCODER"] = encoder
+                call(func, static)
+                start = perf_counter()
+                for _ in range(ops):
+                    call(func, static)
+                row.append((perf_counter() - start) / ops * 1e6)
+            print(f"{case:12s}" + "".join(f"{us:12.2f}" for us in row))
+
+
+if __name__ == "__main__":
+    main()
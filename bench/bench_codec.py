@@ -0,0 +1,56 @@
+# coding: utf-8
+"""
+缓存编码基准测试
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+测量各缓存编码对一个用户资料字典编码加解码的耗时和编码后的字节数，以及开启压缩后的变化
+未安装的可选模块（orjson、msgpack、lz4）会被跳过
+
+    python bench/bench_codec.py [--ops 20000]
+"""
+import os
+import sys
+import argparse
+from datetime import datetime
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cache import Codec     # noqa: E402
+
+
+PROFILE = {
+    "id": 42, "account": "13800000000", "nickname": "测试用户", "avatar_url": "https://example.com/avatar/42.png",
+    "gender": 1, "birthday": "1990-01-02", "app_channel": "web", "app_version": "1.2.3", "os_type": "ios",
+    "os_version": "17.1", "remark": "", "status": 1, "create_time": str(datetime(2024, 1, 2, 3, 4, 5)),
+}
+
+
+def bench(codec, value, ops):
+    start = perf_counter()
+    for _ in range(ops):
+        data = codec.dumps(value)
+        codec.loads(data)
+    return (perf_counter() - start) / ops * 1e6, len(codec.dumps(value))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=20000)
+    args = parser.parse_args()
+
+    large = {"items": [PROFILE] * 50}
+    print(f"{'codec':8s} {'compress':8s} {'profile us':>10s} {'bytes':>6s} {'50x us':>8s} {'bytes':>6s}")
+    for name in ("json", "orjson", "msgpack", "pickle"):
+        for compress, threshold in (("", 0), ("zlib", 256), ("lz4", 256)):
+            codec = Codec(name, compress or "zlib", threshold)
+            try:
+                small_us, small_bytes = bench(codec, PROFILE, args.ops)
+                large_us, large_bytes = bench(codec, large, args.ops // 10)
+            except RuntimeError as e:   # 可选模块未安装
+                print(f"{name:8s} {compress or '-':8s} skipped: {e}")
+                continue
+            print(f"{name:8s} {compress or '-':8s} {small_us:10.2f} {small_bytes:6d} {large_us:8.2f} {large_bytes:6d}")
+
+
+if __name__ == "__main__":
+    main()
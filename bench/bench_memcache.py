@@ -0,0 +1,68 @@
+# coding: utf-8
+"""
+内存缓存基准测试
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+测量MemCache在1千到1百万个键时get、set的单次耗时，以及缓存已满时写入新键（触发淘汰）的耗时，验证耗时不随条目数增长
+安装了cachelib时同时测量原来使用的SimpleCache作为对比
+
+    python bench/bench_memcache.py [--sizes 1000,100000,1000000] [--ops 100000]
+"""
+import os
+import sys
+import random
+import argparse
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cache import MemCache      # noqa: E402
+
+
+def bench(cache, size, ops, churn_ops=2000):
+    keys = [f"key_{i}" for i in range(size)]
+    for key in keys:
+        cache.set(key, key, timeout=3600)
+    sample = [random.choice(keys) for _ in range(ops)]
+
+    start = perf_counter()
+    for key in sample:
+        cache.set(key, key, timeout=3600)
+    set_us = (perf_counter() - start) / ops * 1e6
+
+    start = perf_counter()
+    for key in sample:
+        cache.get(key)
+    get_us = (perf_counter() - start) / ops * 1e6
+
+    start = perf_counter()
+    for i in range(ops):
+        cache.get(f"missing_{i}")
+    miss_us = (perf_counter() - start) / ops * 1e6
+
+    # 缓存已满时写入新键，每次写入都需要淘汰
+    churn_ops = min(ops, churn_ops)
+    start = perf_counter()
+    for i in range(churn_ops):
+        cache.set(f"new_{i}", i, timeout=3600)
+    churn_us = (perf_counter() - start) / churn_ops * 1e6
+    return set_us, get_us, miss_us, churn_us
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--ops", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'backend':12s} {'keys':>9s} {'set us':>8s} {'get us':>8s} {'miss us':>8s} {'evict us':>9s}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        print(f"{'MemCache':12s} {size:9d} {'%8.2f %8.2f %8.2f %9.2f' % bench(MemCache(threshold=size), size, args.ops)}")
+        try:
+            from cachelib import SimpleCache    # 写满后每次写入都遍历全部条目，减少淘汰测试的次数
+        except ImportError:
+            continue
+        print(f"{'SimpleCache':12s} {size:9d} {'%8.2f %8.2f %8.2f %9.2f' % bench(SimpleCache(threshold=size), size, args.ops, max(5, 10 ** 6 // size))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# coding: utf-8
+"""
+密码哈希基准测试
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+gevent下模拟登录高峰：多个协程同时计算密码哈希，另一个协程每1ms sleep一次，
+对比在协程中直接计算和通过run_in_threadpool计算时，其他协程被阻塞的延迟
+
+    python bench/bench_password_hash.py [--logins 20] [--per-login 5] [--method scrypt]
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import os       # noqa: E402
+import sys      # noqa: E402
+import argparse     # noqa: E402
+from time import perf_counter       # noqa: E402
+
+import gevent       # noqa: E402
+from werkzeug.security import generate_password_hash     # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.tool import run_in_threadpool      # noqa: E402
+
+
+def storm(hash_func, logins, per_login):
+    delays = []
+    done = []
+
+    def ping():
+        while not done:
+            start = perf_counter()
+            gevent.sleep(0.001)
+            delays.append(perf_counter() - start - 0.001)
+
+    def login():
+        for _ in range(per_login):
+            hash_func()
+
+    pinger = gevent.spawn(ping)
+    start = perf_counter()
+    gevent.joinall([gevent.spawn(login) for _ in range(logins)])
+    elapsed = perf_counter() - start
+    done.append(True)
+    pinger.join()
+    delays.sort()
+    return elapsed, delays[len(delays) // 2] * 1000, delays[int(len(delays) * 0.99)] * 1000, delays[-1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--per-login", type=int, default=5)
+    parser.add_argument("--method", default="scrypt")
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    def inline():
+        generate_password_hash("password", args.method)
+
+    def pooled():
+        run_in_threadpool(generate_password_hash, ("password", args.method), pool_size=args.pool_size)
+
+    print(f"{'mode':8s} {'total s':>8s} {'p50 ms':>8s} {'p99 ms':>8s} {'max ms':>8s}")
+    for name, func in (("inline", inline), ("pooled", pooled)):
+        print(f"{name:8s} {'%8.2f %8.2f %8.2f %8.2f' % storm(func, args.logins, args.per_login)}")
+
+
+if __name__ == "__main__":
+    main()
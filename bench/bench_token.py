@@ -0,0 +1,59 @@
+# coding: utf-8
+"""
+token校验基准测试
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+使用内存缓存，测量need_token装饰的空接口的单次耗时，对比开启和关闭已验证token缓存，以及stateful和stateless两种模式
+
+    python bench/bench_token.py [--ops 20000]
+"""
+import os
+import sys
+import argparse
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, g      # noqa: E402
+
+from src import cache, before_request   # noqa: E402
+from src.auth import create_token, need_token, verified_tokens      # noqa: E402
+
+
+@need_token
+def view():
+    return g.user_id
+
+
+def bench(app, mode, verify_cache_timeout, ops):
+    app.config.update(TOKEN_MODE=mode, TOKEN_VERIFY_CACHE_TIMEOUT=verify_cache_timeout)
+    verified_tokens.clear()
+    client_info = "web-ios-device"
+    with app.test_request_context("/", headers={"User-Agent": "bench"}):
+        token = create_token(42, "password-hash", client_info)
+    with app.test_request_context("/", headers={"User-Agent": "bench", "token": token}):
+        before_request()
+        g.client_info = client_info
+        view()
+        start = perf_counter()
+        for _ in range(ops):
+            view()
+        return (perf_counter() - start) / ops * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=20000)
+    args = parser.parse_args()
+
+    app = Flask("bench")
+    app.config.update(SECRET_KEY="bench")
+    cache.init_app(app, cache_type="memory")
+
+    print(f"{'mode':10s} {'verify cache':>12s} {'us/call':>8s}")
+    for mode in ("stateful", "stateless"):
+        for timeout in (0, 60):
+            print(f"{mode:10s} {'on' if timeout else 'off':>12s} {bench(app, mode, timeout, args.ops):8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# coding: utf-8
+"""
+有序集合基准测试
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+测量MemCache有序集合在不同成员数量下zadd、zrank、zscore和10个成员的zrange、zrangebyscore的单次耗时，
+redis可以连接时同时测量RedisCache作为对照，redis的耗时包含网络往返，连接不上时跳过
+
+    python bench/bench_zset.py [--sizes 1000,100000,1000000] [--ops 20000] [--redis-uri redis://localhost:6379/15]
+"""
+import os
+import sys
+import random
+import argparse
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask      # noqa: E402
+
+from src.cache import MemCache, RedisCache      # noqa: E402
+
+
+def timed(func, args_list):
+    start = perf_counter()
+    for args in args_list:
+        func(*args)
+    return (perf_counter() - start) / len(args_list) * 1e6
+
+
+def redis_cache(redis_uri):
+    """连接不上redis时返回None"""
+    try:
+        cache = RedisCache(Flask("bench"), redis_uri=redis_uri, socket_connect_timeout=0.5)
+        cache._client.ping()
+    except Exception as e:
+        print(f"skip redis: {e}")
+        return None
+    return cache
+
+
+def bench(name, cache, size, ops):
+    cache.delete("bench")
+    members = {f"m{i}": random.random() for i in range(size)}
+    batch = dict()
+    for member, score in members.items():     # 分批写入，避免单条命令过大
+        batch[member] = score
+        if len(batch) >= 10000:
+            cache.zadd("bench", mapping=batch)
+            batch = dict()
+    if batch:
+        cache.zadd("bench", mapping=batch)
+    members = [f"m{random.randrange(size)}" for _ in range(ops)]
+    starts = [random.randrange(max(size - 10, 1)) for _ in range(ops)]
+    scores = [random.random() for _ in range(ops)]
+
+    zadd_us = timed(lambda m: cache.zadd("bench", mapping=m), [({f"n{i}": scores[i]},) for i in range(ops)])
+    zrank_us = timed(cache.zrank, [("bench", m) for m in members])
+    zscore_us = timed(cache.zscore, [("bench", m) for m in members])
+    zrange_us = timed(cache.zrange, [("bench", s, s + 9) for s in starts])
+    byscore_us = timed(lambda lo: cache.zrangebyscore("bench", lo, "+inf", start=0, num=10), [(s,) for s in scores])
+    cache.delete("bench")
+    print(f"{name:>7s} {size:9d} {zadd_us:8.2f} {zrank_us:9.2f} {zscore_us:10.2f} {zrange_us:10.2f} {byscore_us:11.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--redis-uri", default="redis://localhost:6379/15")
+    args = parser.parse_args()
+
+    caches = [("memory", MemCache())]
+    cache = redis_cache(args.redis_uri)
+    if cache is not None:
+        caches.append(("redis", cache))
+    print(f"{'backend':>7s} {'members':>9s} {'zadd us':>8s} {'zrank us':>9s} {'zscore us':>10s} {'zrange us':>10s} {'byscore us':>11s}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        for name, cache in caches:
+            bench(name, cache, size, args.ops)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,11 @@
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 """
+import os
 import sys
 import re
 import time
+from collections.abc import Mapping
 
 from flask import Flask, g, request
 from flask_sqlalchemy import SQLAlchemy
@@ -16,28 +18,76 @@ from werkzeug.utils import import_string
 from .config import config
 from .logger import Logger
 from .cache import Cache
+from .metrics import Metrics
+from .profiler import Profiler
+from .querystats import QueryStats
+from .compress import Compress
 
 db = SQLAlchemy()
 logger = Logger()
 cache = Cache()
+metrics = Metrics()
+profiler = Profiler()
+query_stats = QueryStats()
+compress = Compress()
+
+
+RE_SLASHES = re.compile('/+')
+
+
+class RequestData(Mapping):
+    """请求参数，第一次读取时才解析请求内容，没有用到参数的请求（如文档、404）不做解析"""
+    __slots__ = ("_data",)
+
+    def __init__(self):
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.load()
+        return self._data
+
+    @staticmethod
+    def load():
+        # 搜集参数信息
+        if request.method == "POST":
+            if request.is_json:
+                request_data = request.get_json(silent=True)
+            else:
+                request_data = request.form
+        elif request.method == "GET":
+            request_data = request.args
+        else:
+            request_data = request.values
+        return request_data if request_data and isinstance(request_data, Mapping) else dict()
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def to_dict(self):
+        """返回参数的普通字典，用于序列化"""
+        return dict(self.data)
 
 
 def before_request():
     """全局请求前处理函数"""
     g.request_stime = time.time()
-    g.cur_path = re.sub('/+', '/', request.path + '/')
-
-    # 搜集参数信息
-    if request.method == "POST":
-        if request.is_json:
-            request_data = request.get_json(silent=True)
-        else:
-            request_data = request.form
-    elif request.method == "GET":
-        request_data = request.args
-    else:
-        request_data = request.values
-    g.request_data = request_data if request_data else dict()
+    cur_path = request.path + '/'
+    g.cur_path = RE_SLASHES.sub('/', cur_path) if '//' in cur_path else cur_path
+    g.request_data = RequestData()
 
 
 def check_app(app):
@@ -78,13 +128,23 @@ def create_app(env="dev", name="app"):
     # 初始化插件
     logger.init_app(app)
     db.init_app(app)
+    query_stats.init_app(app, db)
     cache.init_app(app, cache_type=app.config.get("CACHE_TYPE"))
+    from .auth import revoked_tokens
+    revoked_tokens.init_app(app)    # 检查无状态token使用的缓存类型
+    metrics.init_app(app)
+    profiler.init_app(app, profile_dir=app.config.get("PROFILE_DIR") or os.path.join(logger.log_path, "profile"))
+    compress.init_app(app)     # 在metrics之后注册，响应先压缩再统计大小
 
     # 加载蓝图模块
     blueprints = ["src.api:api"]
     for bp_name in blueprints:
         app.register_blueprint(import_string(bp_name))
 
+    # 编译接口参数校验
+    from .schema import Schema
+    Schema(app, blueprint_names=["api"])
+
     # 加载钩子函数
     app.before_request(before_request)
 
@@ -4,17 +4,17 @@
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 """
-import re
 from copy import deepcopy
 from functools import wraps
 
-from flask import Blueprint, current_app, g, request
+from flask import Blueprint, Response, current_app, g, request
 from werkzeug.exceptions import HTTPException
 
-from ..response import json_return, GLOBAL_REQUEST_PARAM_LIST, GLOBAL_RESPONSE_CODE_LIST
+from ..response import ResponseCodes, get_json_dumps, GLOBAL_REQUEST_PARAM_LIST, GLOBAL_RESPONSE_CODE_LIST
 from ..tool import get_error_info
 from ..auth import TokenErr, need_token, create_token, clear_token
-from ..model.base import AdminUser as UserInfo
+from ..schema import CommonParams, ParamErr
+from ..model.base import load_user
 
 
 api = Blueprint("api", __name__, url_prefix="/api")
@@ -26,6 +26,7 @@ COMMON_REQUEST_PARAM_LIST.update({
     "device_uuid": {"type": "str", "desc": "设备唯一标识", "reg": r"\w+", "required": True},
 })
 api.COMMON_REQUEST_PARAM_LIST = COMMON_REQUEST_PARAM_LIST
+api.record_once(lambda state: CommonParams.of(api))   # 注册蓝图时预先编译公共参数校验
 
 # 公共返回值列表
 COMMON_RESPONSE_CODE_LIST = deepcopy(GLOBAL_RESPONSE_CODE_LIST)
@@ -53,48 +54,65 @@ api.COMMON_RESPONSE_CODE_LIST = COMMON_RESPONSE_CODE_LIST
 
 
 def api_return(code, msg=None, data=None, **kwargs):
+    return _api_return(code, msg, data, kwargs)
+
+
+def static_api_return(code, msg=None, data=None):
+    """返回内容只由返回码和固定的提示信息决定时使用，编码结果会被缓存，不要传入每次请求都不同的msg和data"""
+    return _api_return(code, msg, data, None, static=True)
+
+
+def _api_return(code, msg, data, kwargs, static=False):
     code = str(code).upper()
-    response_codes = getattr(current_app.blueprints.get(request.blueprint, current_app), "COMMON_RESPONSE_CODE_LIST", COMMON_RESPONSE_CODE_LIST)
-    if code not in response_codes.keys():
+    app = current_app._get_current_object()
+    response_codes = ResponseCodes.of(app.blueprints.get(request.blueprint, app), COMMON_RESPONSE_CODE_LIST,
+                                      app.config.get("RESPONSE_BODY_CACHE_SIZE", 256))
+    if code not in response_codes.table:
         code = "ERR"
+    g.api_code = code
     if msg is None:
-        msg = response_codes[code][1]
-    if data is None:
-        data = ""
+        msg = response_codes.table[code][1]
+    dumps = get_json_dumps(app.config.get("RESPONSE_JSON_ENCODER", "json"))
 
-    result = {"code": response_codes[code][0], "msg": msg, "data": data}
-    result.update(kwargs)
-    return json_return(result)
+    if kwargs:
+        result = {"code": response_codes.table[code][0], "msg": msg, "data": "" if data is None else data}
+        result.update(kwargs)
+        body = dumps(result)
+    else:
+        body = response_codes.body(code, msg, data, dumps, static)
+    return Response(body, mimetype="application/json")
 
 
 @api.before_request
 def before_request():
     """蓝图请求前处理函数"""
-    for field_name, p in getattr(current_app.blueprints.get(request.blueprint, current_app), "COMMON_REQUEST_PARAM_LIST", dict()).items():     # 验证公共参数
-        field_reg = p.get("reg")
-        field_required = p.get("required")
-        field_data = str(g.request_data.get(field_name, "")).strip()
-        if field_required and re.search(field_reg, str(field_data)) is None:
-            current_app.logger.error(f"公共参数错误：{field_name}:{field_data}")
-            return api_return("PARAM_ERROR", f"公共参数错误：{field_name}")
-        setattr(g, field_name, field_data)
-    g.client_info = f"{g.get('app_channel', '')}-{g.get('os_type', '')}-{g.get('device_uuid', '')}"
+    ctx_g = g._get_current_object()     # 取出实际对象，避免多次通过代理访问
+    # 验证公共参数
+    values = CommonParams.of(current_app.blueprints.get(request.blueprint, current_app))(ctx_g.request_data)
+    vars(ctx_g).update(values)
+    ctx_g.client_info = f"{ctx_g.get('app_channel', '')}-{ctx_g.get('os_type', '')}-{ctx_g.get('device_uuid', '')}"
 
 
 @api.errorhandler(TokenErr)
 def token_error_handler(error):
     current_app.logger.error("Token错误：{0}, {1}".format(error.desc, str(error.kwargs)))
-    return api_return(error.name, error.desc)
+    return static_api_return(error.name, error.desc)
+
+
+@api.errorhandler(ParamErr)
+def param_error_handler(error):
+    current_app.logger.error("参数错误：{0}, {1}".format(error.desc, str(error.kwargs)))
+    return static_api_return(error.name, error.desc, error.kwargs)
 
 
 @api.errorhandler(Exception)
 def other_error_handler(error):
     if isinstance(error, HTTPException):
         current_app.logger.error("Http错误：{0}, {1}".format(error.code, error.description))
-        return api_return(error.code)
+        return static_api_return(error.code)
     file, line, func, _ = get_error_info()
     current_app.logger.error('代码错误：{0}, {1}({2})[{3}]'.format(str(error), file, line, func))
-    return api_return("ERR", "服务器内部异常")
+    return static_api_return("ERR", "服务器内部异常")
 
 
 def need_login(func):
@@ -106,7 +124,7 @@ def need_login(func):
         if not user_id:
             raise TokenErr("TOKEN_USER_ERROR", "无效的用户ID")
 
-        user = UserInfo.query.filter_by(id=user_id).first()
+        user = load_user(user_id)
         if user is None:
             raise TokenErr("TOKEN_USER_ERROR", "无效的用户", user_id=user_id)
         if user.status != 1:
@@ -123,9 +141,9 @@ def login_user(user):
     return create_token(user.id, user.password, g.get("client_info"))
 
 
-def logout_user():
-    """登出用户，清除缓存token"""
-    clear_token(g.get("user_id", 0))
+def logout_user(all_tokens=False):
+    """登出用户，清除缓存token，all_tokens为True时同时吊销该用户的其他token"""
+    clear_token(g.get("user_id", 0), None if all_tokens else g.get("token_id"))
 
 
 # 导入蓝图要加载的接口
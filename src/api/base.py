@@ -10,7 +10,9 @@ from datetime import datetime
 from flask import g, current_app, request
 
 from .. import db
-from ..tool import is_mobile, is_password, is_sms_code, is_date, get_datetime, create_random_num, create_uuid_str, datediff
+from ..auth import clear_token
+from ..schema import params
+from ..tool import get_datetime, create_random_num, create_uuid_str, datediff
 from ..service import send_sms_by_alisms, upload_file_to_oss, delete_file_from_oss
 from ..model.base import AdminUser as UserInfo, VerifySMS
 
@@ -18,6 +20,7 @@ from . import api, api_return, need_login, login_user, logout_user
 
 
 @api.post("/get_register_code/")
+@params(account="mobile")
 def get_register_code():
     """
     #group  基础
@@ -32,11 +35,7 @@ def get_register_code():
         "data": {"code": "123456"}
     }
     """
-    account = str(g.request_data.get("account", "")).strip()
-
-    if not is_mobile(account):
-        current_app.logger.error("手机号参数错误: account:%s", account)
-        return api_return("PARAM_MOBILE_ERROR", "手机号参数错误")
+    account = g.params["account"]
 
     user = UserInfo.query.filter_by(account=account).first()
     if user:
@@ -84,6 +83,7 @@ def get_register_code():
 
 
 @api.post("/register/")
+@params(account="mobile", password="password", code="sms_code")
 def register():
     """
     #group  基础
@@ -117,19 +117,9 @@ def register():
         }
     }
     """
-    account = str(g.request_data.get("account", "")).strip()
-    password = str(g.request_data.get("password", "")).strip()
-    code = str(g.request_data.get("code", "")).strip()
-
-    if not is_mobile(account):
-        current_app.logger.error("手机号参数错误: account:%s", account)
-        return api_return("PARAM_MOBILE_ERROR", "手机号参数错误")
-    if not is_password(password):
-        current_app.logger.error("密码参数错误: account:%s, password:%s", account, password)
-        return api_return("PARAM_FORMAT_ERROR", "密码参数错误")
-    if not is_sms_code(code):
-        current_app.logger.error("验证码参数错误: account:%s, code:%s", account, code)
-        return api_return("PARAM_FORMAT_ERROR", "验证码参数错误")
+    account = g.params["account"]
+    password = g.params["password"]
+    code = g.params["code"]
 
     user = UserInfo.query.filter_by(account=account).first()
     if user:
@@ -170,6 +160,7 @@ def register():
 
 
 @api.post("/login/")
+@params(account="mobile", password="password")
 def login():
     """
     #group  基础
@@ -201,15 +192,8 @@ def login():
         }
     }
     """
-    account = str(g.request_data.get("account", "")).strip()
-    password = str(g.request_data.get("password", "")).strip()
-
-    if not is_mobile(account):
-        current_app.logger.error("手机号参数错误: account:%s", account)
-        return api_return("PARAM_MOBILE_ERROR", "手机号参数错误")
-    if not is_password(password):
-        current_app.logger.error("密码参数错误: account:%s, password:%s", account, password)
-        return api_return("PARAM_FORMAT_ERROR", "密码参数错误")
+    account = g.params["account"]
+    password = g.params["password"]
 
     user = UserInfo.query.filter_by(account=account).first()
     if user is None:
@@ -221,6 +205,8 @@ def login():
     if not user.check_password(password):
         current_app.logger.error("密码错误: account:%s", account)
         return api_return("USER_PWD_ERROR", "密码错误")
+    if user.needs_rehash():     # 哈希强度配置修改后，登录时按新配置重新生成
+        user.password = password
 
     # 更新用户信息
     user.app_channel = g.get("app_channel", "")
@@ -322,6 +308,10 @@ def get_user():
 
 @api.post("/update_user/")
 @need_login
+@params(nickname={"min_len": 1, "max_len": 30, "error": ("PARAM_ERROR", "昵称长度不符，需要1-30个字符")},
+        gender={"choices": (1, 2), "error": ("PARAM_ERROR", "性别参数错误")},
+        birthday={"format": "date", "error": ("PARAM_ERROR", "生日参数错误")},
+        remark={"max_len": 250, "error": ("PARAM_ERROR", "备注长度不符，需要少于250个字符")})
 def update_user():
     """
     #group  基础
@@ -339,36 +329,24 @@ def update_user():
         "data": ""
     }
     """
-    nickname = g.request_data.get("nickname")
-    gender = g.request_data.get("gender")
-    birthday = g.request_data.get("birthday")
-    remark = g.request_data.get("remark")
+    nickname = g.params["nickname"]
+    gender = g.params["gender"]
+    birthday = g.params["birthday"]
+    remark = g.params["remark"]
 
     if nickname is not None:
-        nickname = str(nickname).strip()
-        if len(nickname) < 1 or len(nickname) > 30:
-            current_app.logger.error("昵称长度不符合: account:%s, nickname:%s", g.user.account, nickname)
-            return api_return("PARAM_ERROR", "昵称长度不符，需要1-30个字符")
         g.user.nickname = nickname
 
     if gender is not None:
-        if gender not in [1, 2]:
-            current_app.logger.error("性别参数错误: account:%s, gender:%s", g.user.account, gender)
-            return api_return("PARAM_ERROR", "性别参数错误")
         g.user.gender = gender
 
     if birthday is not None:
-        birthday = str(birthday).strip()
-        if not is_date(birthday) or datediff(datetime.now().strftime("%F"), birthday) < 1:
+        if datediff(datetime.now().strftime("%F"), birthday) < 1:
             current_app.logger.error("生日参数错误: account:%s, birthday:%s", g.user.account, birthday)
             return api_return("PARAM_ERROR", "生日参数错误")
         g.user.birthday = birthday
 
     if remark is not None:
-        remark = str(remark).strip()
-        if len(nickname) > 250:
-            current_app.logger.error("备注长度不符合: account:%s, remark:%s", g.user.account, remark)
-            return api_return("PARAM_ERROR", "备注长度不符，需要少于250个字符")
         g.user.remark = remark
 
     try:
@@ -383,6 +361,8 @@ def update_user():
 
 @api.post("/update_password/")
 @need_login
+@params(old_password={"format": "password", "error": ("PARAM_ERROR", "密码参数错误")},
+        new_password={"format": "password", "error": ("PARAM_ERROR", "密码参数错误")})
 def update_password():
     """
     #group  基础
@@ -398,17 +378,13 @@ def update_password():
         "data": ""
     }
     """
-    old_password = str(g.request_data.get("old_password", "")).strip()
-    new_password = str(g.request_data.get("new_password", "")).strip()
+    old_password = g.params["old_password"]
+    new_password = g.params["new_password"]
 
     if old_password == new_password:
         current_app.logger.error("新密码不能与旧密码相同: account:%s", g.user.account)
         return api_return("PARAM_ERROR", "新密码不能与旧密码相同")
 
-    if not is_password(old_password) or not is_password(new_password):
-        current_app.logger.error("密码参数错误: account:%s", g.user.account)
-        return api_return("PARAM_ERROR", "密码参数错误")
-
     if not g.user.check_password(old_password):
         current_app.logger.error("旧密码错误: account:%s", g.user.account)
         return api_return("USER_PWD_ERROR", "旧密码错误")
@@ -416,7 +392,7 @@ def update_password():
     g.user.password = new_password
     try:
         db.session.commit()
-        logout_user()
+        logout_user(all_tokens=True)
         current_app.logger.info("修改成功: account:%s", g.user.account)
         return api_return("OK", "修改成功，请重新登录！")
     except Exception as e:
@@ -475,6 +451,7 @@ def upload_avatar():
 
 
 @api.post("/get_reset_password_code/")
+@params(account="mobile")
 def get_reset_password_code():
     """
     #group  基础
@@ -490,11 +467,7 @@ def get_reset_password_code():
         "data": {"code": "123456"}
     }
     """
-    account = str(g.request_data.get("account", "")).strip()
-
-    if not is_mobile(account):
-        current_app.logger.error("手机号参数错误: account:%s", account)
-        return api_return("PARAM_MOBILE_ERROR", "手机号参数错误")
+    account = g.params["account"]
 
     user = UserInfo.query.filter_by(account=account).first()
     if user is None:
@@ -545,6 +518,7 @@ def get_reset_password_code():
 
 
 @api.post("/reset_password/")
+@params(account="mobile", password="password", code="sms_code")
 def reset_password():
     """
     #group  基础
@@ -578,19 +552,9 @@ def reset_password():
         }
     }
     """
-    account = str(g.request_data.get("account", "")).strip()
-    password = str(g.request_data.get("password", "")).strip()
-    code = str(g.request_data.get("code", "")).strip()
-
-    if not is_mobile(account):
-        current_app.logger.error("手机号参数错误: account:%s", account)
-        return api_return("PARAM_MOBILE_ERROR", "手机号参数错误")
-    if not is_password(password):
-        current_app.logger.error("密码参数错误: account:%s, password:%s", account, password)
-        return api_return("PARAM_FORMAT_ERROR", "密码参数错误")
-    if not is_sms_code(code):
-        current_app.logger.error("验证码参数错误: account:%s, code:%s", account, code)
-        return api_return("PARAM_FORMAT_ERROR", "验证码参数错误")
+    account = g.params["account"]
+    password = g.params["password"]
+    code = g.params["code"]
 
     user = UserInfo.query.filter_by(account=account).first()
     if user is None:
@@ -618,7 +582,8 @@ def reset_password():
         current_app.logger.error("重置失败: account:%s, %s", account, e)
         return api_return("FAILED", "重置失败")
 
-    # 缓存token
+    # 清除修改密码前的token，再缓存新的token
+    clear_token(user.id)
     token = login_user(user)
 
     # 格式化返回值
@@ -634,6 +599,7 @@ def reset_password():
 
 @api.post("/get_change_account_code/")
 @need_login
+@params(new_account="mobile")
 def get_change_account_code():
     """
     #group  基础
@@ -650,12 +616,8 @@ def get_change_account_code():
         "data": {"code": "123456"}
     }
     """
-    new_account = str(g.request_data.get("new_account", "")).strip()
-    password = str(g.request_data.get("password", "")).strip()
-
-    if not is_mobile(new_account):
-        current_app.logger.error("手机号参数错误: account:%s, new_account:%s", g.user.account, new_account)
-        return api_return("PARAM_MOBILE_ERROR", "手机号参数错误")
+    new_account = g.params["new_account"]
+    password = g.params["password"]
 
     if not g.user.check_password(password):
         current_app.logger.error("密码错误: account:%s", g.user.account)
@@ -709,6 +671,7 @@ def get_change_account_code():
 
 @api.post("/change_account/")
 @need_login
+@params(new_account="mobile", code="sms_code")
 def change_account():
     """
     #group  基础
@@ -724,15 +687,8 @@ def change_account():
         "data": ""
     }
     """
-    new_account = str(g.request_data.get("new_account", "")).strip()
-    code = str(g.request_data.get("code", "")).strip()
-
-    if not is_mobile(new_account):
-        current_app.logger.error("手机号参数错误: account:%s, new_account:%s", g.user.account, new_account)
-        return api_return("PARAM_MOBILE_ERROR", "手机号参数错误")
-    if not is_sms_code(code):
-        current_app.logger.error("验证码参数错误: account:%s, new_account:%s, code:%s", g.user.account, new_account, code)
-        return api_return("PARAM_FORMAT_ERROR", "验证码参数错误")
+    new_account = g.params["new_account"]
+    code = g.params["code"]
 
     # 验证新账号是否已注册
     new_user = UserInfo.query.filter_by(account=new_account).first()
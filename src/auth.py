@@ -5,18 +5,76 @@
 验证token的装饰器
 """
 import time
-from functools import wraps
+from functools import lru_cache, wraps
 from hmac import compare_digest
+from uuid import uuid4
 
 from flask import current_app, g, request
-from itsdangerous import URLSafeSerializer
+from itsdangerous import SignatureExpired, URLSafeSerializer, URLSafeTimedSerializer
 
 from . import cache
+from .cache import LRUStore, RedisCache
 from .tool import get_client_ident
 
 
 # token缓存前缀
 TOKEN_PREFIX = "user_token_"
+# 无状态模式下已吊销token的有序集合，成员为"jti:<token_id>"或"user:<user_id>"，分数为吊销时间
+TOKEN_REVOKED_KEY = "token_revoked"
+
+# 当前进程内已验证签名的token及其解析结果，有效期内重复请求不再做签名校验和解码
+verified_tokens = LRUStore()
+
+
+class RevocationList:
+    """
+    无状态token的吊销列表，保存在缓存的有序集合中，每个进程在本地保存一份副本并按间隔增量同步
+    同步失败时继续使用本地副本，缓存变慢或不可用时校验token不受影响
+    """
+    def __init__(self):
+        self._revoked = dict()      # 成员 -> 吊销时间
+        self._synced_at = 0
+        self._next_sync = 0
+
+    def init_app(self, app):
+        """无状态token的吊销列表需要在所有进程和服务器间共享，只能使用redis或tiered缓存"""
+        if app.config.get("TOKEN_MODE", "stateful") != "stateless":
+            return
+        if not isinstance(cache, RedisCache):
+            raise ValueError(f"TOKEN_MODE为stateless时CACHE_TYPE需要为redis或tiered，当前为{app.config.get('CACHE_TYPE')}")
+
+    def revoke(self, member, lifetime):
+        now = time.time()
+        self._revoked[member] = now
+        cache.zadd(TOKEN_REVOKED_KEY, mapping={member: now})
+        # 早于token有效期的吊销记录对应的token已经过期，不再需要保留
+        cache.zremrangebyscore(TOKEN_REVOKED_KEY, "-inf", now - lifetime)
+
+    def sync(self, interval, lifetime):
+        now = time.time()
+        if now < self._next_sync:
+            return
+        self._next_sync = now + interval
+        try:
+            # 多取一个间隔的数据，容忍各服务器之间的时钟误差
+            items = cache.zrangebyscore(TOKEN_REVOKED_KEY, self._synced_at - interval, "+inf", withscores=True)
+        except Exception as e:
+            current_app.logger.error(f"token吊销列表同步失败：{e}")
+            return
+        self._synced_at = now
+        for member, revoked_at in items:
+            member = member.decode() if isinstance(member, bytes) else member
+            self._revoked[member] = max(revoked_at, self._revoked.get(member, 0))
+        expired = now - lifetime
+        self._revoked = {member: revoked_at for member, revoked_at in self._revoked.items() if revoked_at > expired}
+
+    def is_revoked(self, token_id, user_id, create_time):
+        if f"jti:{token_id}" in self._revoked:
+            return True
+        return self._revoked.get(f"user:{user_id}", 0) >= create_time
+
+
+revoked_tokens = RevocationList()
 
 
 class TokenErr(Exception):
@@ -26,29 +84,79 @@ class TokenErr(Exception):
         self.kwargs = kwargs
 
 
+def is_stateless():
+    """是否使用无状态token"""
+    return current_app.config.get("TOKEN_MODE", "stateful") == "stateless"
+
+
+@lru_cache(maxsize=8)
+def get_token_serializer(key):
+    """按SECRET_KEY复用序列化器"""
+    return URLSafeSerializer(key)
+
+
+@lru_cache(maxsize=8)
+def get_timed_token_serializer(key):
+    """按SECRET_KEY复用带时间戳的序列化器，用于无状态token"""
+    return URLSafeTimedSerializer(key, salt="stateless-token")
+
+
+def load_token(token):
+    """
+    解析token，优先从已验证缓存中读取
+    :param token: token
+    :return: (user_id, password, user_ident, token_lifetime, create_time)，无状态token多一个token_id
+    """
+    now = time.time()
+    item = verified_tokens.get(token, now)
+    if item is not None:
+        return item[1]
+    key = current_app.config.get("SECRET_KEY", "")
+    expires = now + current_app.config.get("TOKEN_VERIFY_CACHE_TIMEOUT", 60)
+    if is_stateless():
+        max_age = current_app.config.get("TOKEN_LIFETIME", 3 * 24 * 60 * 60)
+        claims = tuple(get_timed_token_serializer(key).loads(token, max_age=max_age))
+        expires = min(expires, claims[4] + max_age)
+    else:
+        claims = tuple(get_token_serializer(key).loads(token))
+    if expires > now:
+        verified_tokens.threshold = current_app.config.get("TOKEN_VERIFY_CACHE_SIZE", verified_tokens.threshold)
+        verified_tokens.set(token, (expires, claims), now)
+    return claims
+
+
 def create_token(user_id, password, client_info=""):
     """
-    生成并缓存token
+    生成并缓存token，无状态模式下只签名不缓存
     :param user_id:  缓存token的用户标识
     :param password: 用户密码
     :param client_info: 客户端信息
     :return: token
     """
-    create_time = int(time.time())
     user_ident = get_client_ident(client_info)
     token_lifetime = current_app.config.get("TOKEN_LIFETIME", 3 * 24 * 60 * 60)
     key = current_app.config.get("SECRET_KEY", "")
-    token_serializer = URLSafeSerializer(key)
+    if is_stateless():
+        # 创建时间保留小数，避免修改密码后同一秒内重新登录的token被判定为已吊销
+        token_serializer = get_timed_token_serializer(key)
+        return token_serializer.dumps((user_id, password, user_ident, token_lifetime, time.time(), uuid4().hex))
+    create_time = int(time.time())
+    token_serializer = get_token_serializer(key)
     token = token_serializer.dumps((user_id, password, user_ident, token_lifetime, create_time))
     cache.set("{0}{1}".format(TOKEN_PREFIX, user_id), token, timeout=token_lifetime)
     return token
 
 
-def clear_token(user_id):
+def clear_token(user_id, token_id=None):
     """
-    清除token
+    清除token，无状态模式下吊销指定token，不指定token_id时吊销该用户的全部token
     :param user_id: 缓存token的用户标识
+    :param token_id: 无状态token的标识
     """
+    if is_stateless():
+        member = f"jti:{token_id}" if token_id else f"user:{user_id}"
+        revoked_tokens.revoke(member, current_app.config.get("TOKEN_LIFETIME", 3 * 24 * 60 * 60))
+        return
     cache.delete("{0}{1}".format(TOKEN_PREFIX, user_id))
 
 
@@ -62,10 +170,11 @@ def need_token(func):
             raise TokenErr("TOKEN_NOT_FOUND", "缺少登录凭证")
 
         # 解析token
-        key = current_app.config.get("SECRET_KEY", "")
         try:
-            token_serializer = URLSafeSerializer(key)
-            user_id, password, user_ident, token_lifetime, create_time = token_serializer.loads(token)
+            claims = load_token(token)
+            user_id, password, user_ident, token_lifetime, create_time = claims[:5]
+        except SignatureExpired:
+            raise TokenErr("TOKEN_INVALID", "登录凭证已过期")
         except Exception:
             raise TokenErr("TOKEN_ERROR", "非法的登录凭证")
 
@@ -74,29 +183,41 @@ def need_token(func):
         if not compare_digest(str(user_ident), str(identifier)):
             raise TokenErr("TOKEN_CHANGED", "登录环境改变", user_id=user_id)
 
-        # 判断token缓存是否有效
-        cached_token = cache.get("{0}{1}".format(TOKEN_PREFIX, user_id))
-        if cached_token:
-            if not compare_digest(cached_token, token):  # token不同时，把cached_token解析出来比对哪里有变化，以便给出精准提示
-                try:
-                    _user_id, _password, _user_ident, _token_lifetime, _create_time = token_serializer.loads(cached_token)
-                except Exception:
-                    raise TokenErr("TOKEN_INVALID", "登录凭证已失效", user_id=user_id)
-                if user_id != _user_id or password != _password:
-                    raise TokenErr("TOKEN_INVALID", "登录凭证已失效", user_id=user_id)
-                if user_ident != _user_ident:
-                    raise TokenErr("TOKEN_CHANGED", "登录环境改变", user_id=user_id)
-                if int(create_time) < int(_create_time):
-                    raise TokenErr("TOKEN_INVALID", "登录凭证已过期", user_id=user_id)
+        if is_stateless():
+            # 无状态token只需检查本地的吊销列表
+            revoked_tokens.sync(current_app.config.get("TOKEN_REVOKE_SYNC_INTERVAL", 5), token_lifetime)
+            if revoked_tokens.is_revoked(claims[5], user_id, create_time):
+                raise TokenErr("TOKEN_INVALID", "登录凭证已失效", user_id=user_id)
+            g.token_id = claims[5]
         else:
-            raise TokenErr("TOKEN_INVALID", "登录凭证已过期", user_id=user_id)
-
-        # 刷新token时间
-        if token_lifetime:
-            cache.set("{0}{1}".format(TOKEN_PREFIX, user_id), token, timeout=token_lifetime)
+            check_cached_token(token, user_id, password, user_ident, token_lifetime, create_time)
 
         g.user_id = user_id
         g.user_login_time = create_time
 
         return func(*args, **kwargs)
     return wrapper
+
+
+def check_cached_token(token, user_id, password, user_ident, token_lifetime, create_time):
+    """判断token缓存是否有效，剩余有效时间不足时同时续期"""
+    token_key = "{0}{1}".format(TOKEN_PREFIX, user_id)
+    if token_lifetime:
+        refresh_ratio = current_app.config.get("TOKEN_REFRESH_RATIO", 0.5)
+        cached_token = cache.get_and_touch(token_key, token_lifetime, refresh_ratio)
+    else:
+        cached_token = cache.get(token_key)
+    if cached_token:
+        if not compare_digest(cached_token, token):  # token不同时，把cached_token解析出来比对哪里有变化，以便给出精准提示
+            try:
+                _user_id, _password, _user_ident, _token_lifetime, _create_time = load_token(cached_token)
+            except Exception:
+                raise TokenErr("TOKEN_INVALID", "登录凭证已失效", user_id=user_id)
+            if user_id != _user_id or password != _password:
+                raise TokenErr("TOKEN_INVALID", "登录凭证已失效", user_id=user_id)
+            if user_ident != _user_ident:
+                raise TokenErr("TOKEN_CHANGED", "登录环境改变", user_id=user_id)
+            if int(create_time) < int(_create_time):
+                raise TokenErr("TOKEN_INVALID", "登录凭证已过期", user_id=user_id)
+    else:
+        raise TokenErr("TOKEN_INVALID", "登录凭证已过期", user_id=user_id)
@@ -4,21 +4,173 @@
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 """
+import os
+import re
+import sys
+import atexit
 import json
-from time import time
+import mmap
+import struct
+import tempfile
+import threading
+import uuid
+import zlib
+import pickle
+import decimal
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import date, datetime
+from fnmatch import fnmatchcase
+from functools import lru_cache, partial, wraps
+from hashlib import md5
+from heapq import heappush, heappop, heapify
+from importlib import import_module
+from math import log
+from random import random
+from time import time, sleep, perf_counter
 
-from cachelib import SimpleCache
+from flask import current_app, g, has_request_context, jsonify, make_response, request
 
 
-def load_object(value):
+# 缓存值编码标记：json编码的数据不加标记，兼容已有的缓存数据，其他编码在首字节写入标记
+# 标记值均为json文本不可能出现的首字节，因此新旧格式的数据可以混合存放，逐步迁移
+TAG_MSGPACK = 0x01
+TAG_PICKLE = 0x02
+TAG_ZLIB = 0x03
+TAG_LZ4 = 0x04
+
+# 把缓存键中含数字的段（ID、命名空间版本号、摘要等）替换为*，得到用于统计的逻辑前缀，
+# 例如user_token_42 -> user_token_*，user:42:7:profile -> user:*:*:profile
+RE_KEY_VARIABLE = re.compile(r"(?:^|(?<=[_:.]))[^_:.]*\d[^_:.]*")
+# 统计的前缀数量上限，超出后新的前缀合并统计
+STATS_MAX_PREFIXES = 1000
+
+
+@lru_cache(maxsize=None)
+def _import_module(name):
+    try:
+        return import_module(name)
+    except ImportError:
+        raise RuntimeError(f"{name.split('.')[0]} module not found")
+
+
+def _wait(seconds):
+    """等待其他调用方时使用，gevent协程中用gevent.sleep，未打补丁时time.sleep会阻塞整个工作进程"""
+    gevent = sys.modules.get("gevent")
+    if gevent is not None and isinstance(gevent.getcurrent(), gevent.Greenlet):
+        gevent.sleep(seconds)
+    else:
+        sleep(seconds)
+
+
+def _json_default(obj):
+    """json和orjson编码时日期时间转为ISO格式字符串，Decimal转为字符串不丢失精度，解码后均为字符串"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    elif isinstance(obj, decimal.Decimal):
+        return str(obj)
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
+def _msgpack_default(obj):
+    msgpack = _import_module("msgpack")
+    if isinstance(obj, datetime):
+        return msgpack.ExtType(1, obj.isoformat().encode())
+    elif isinstance(obj, date):
+        return msgpack.ExtType(2, obj.isoformat().encode())
+    elif isinstance(obj, decimal.Decimal):
+        return msgpack.ExtType(3, str(obj).encode())
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not msgpack serializable")
+
+
+def _msgpack_ext_hook(code, data):
+    if code == 1:
+        return datetime.fromisoformat(data.decode())
+    elif code == 2:
+        return date.fromisoformat(data.decode())
+    elif code == 3:
+        return decimal.Decimal(data.decode())
+    return _import_module("msgpack").ExtType(code, data)
+
+
+def load_object(value, allow_pickle=False):
+    """
+    根据首字节标记解码缓存值
+    pickle解码可以执行任意代码，只有缓存实例配置为pickle编码时才允许，否则按无效值返回None
+    """
     if value is None:
         return None
     try:
+        tag = value[0] if isinstance(value, bytes) and value else None
+        if tag == TAG_ZLIB:
+            return load_object(zlib.decompress(value[1:]), allow_pickle)
+        elif tag == TAG_LZ4:
+            return load_object(_import_module("lz4.frame").decompress(value[1:]), allow_pickle)
+        elif tag == TAG_MSGPACK:
+            return _import_module("msgpack").unpackb(value[1:], ext_hook=_msgpack_ext_hook, strict_map_key=False)
+        elif tag == TAG_PICKLE:
+            return pickle.loads(value[1:]) if allow_pickle else None
         return json.loads(value)
     except TypeError:
         return None
 
 
+class Codec:
+    """
+    缓存值编码器，可选json、orjson、msgpack、pickle
+    只有msgpack和pickle能还原datetime、date、Decimal等类型，json和orjson编码后读取到的是字符串
+    编码后超过compress_threshold字节的数据使用zlib或lz4压缩，解码时根据首字节标记自动识别
+    """
+    def __init__(self, name="json", compress="zlib", compress_threshold=0):
+        self.name = name
+        self.compress = compress
+        self.compress_threshold = compress_threshold
+        self.track_bytes = False        # 开启缓存统计时记录最近一次编码、解码的字节数
+        self._bytes = threading.local()     # gevent下为协程级别，并发的协程互不影响
+
+    def init_app(self, app, name=None, compress=None, compress_threshold=None):
+        self.name = name if name else app.config.get("CACHE_CODEC", self.name)
+        self.compress = compress if compress else app.config.get("CACHE_COMPRESS", self.compress)
+        self.compress_threshold = compress_threshold if compress_threshold is not None else app.config.get("CACHE_COMPRESS_THRESHOLD", self.compress_threshold)
+        self.dumps(None)     # 启动时检查依赖的模块是否存在
+
+    def dumps(self, value, name=None):
+        name = (name or self.name).lower()
+        if name == "pickle" and self.name.lower() != "pickle":
+            raise ValueError("使用pickle编码需要将CACHE_CODEC设置为pickle")
+        if name == "json":
+            data = json.dumps(value, default=_json_default).encode()
+        elif name == "orjson":
+            data = _import_module("orjson").dumps(value, default=_json_default, option=_import_module("orjson").OPT_NON_STR_KEYS)
+        elif name == "msgpack":
+            data = bytes((TAG_MSGPACK,)) + _import_module("msgpack").packb(value, default=_msgpack_default)
+        elif name == "pickle":
+            data = bytes((TAG_PICKLE,)) + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            raise ValueError("指定的缓存编码错误")
+
+        if self.compress_threshold and len(data) > self.compress_threshold and not isinstance(value, int):    # 计数器不压缩
+            if self.compress == "lz4":
+                data = bytes((TAG_LZ4,)) + _import_module("lz4.frame").compress(data)
+            else:
+                data = bytes((TAG_ZLIB,)) + zlib.compress(data)
+        if self.track_bytes:
+            self._bytes.count = len(data)
+        return data
+
+    def loads(self, value):
+        if self.track_bytes and value is not None:
+            self._bytes.count = len(value)
+        return load_object(value, allow_pickle=self.name.lower() == "pickle")
+
+    def last_bytes(self, reset=False):
+        """返回当前线程或协程最近一次编码、解码的原始字节数"""
+        count = getattr(self._bytes, "count", 0)
+        if reset:
+            self._bytes.count = 0
+        return count
+
+
 class Cache:
     def __init__(self, app=None, cache_type="", **kwargs):
         self.cache_type = cache_type
@@ -38,37 +190,578 @@ class Cache:
             self.__class__ = MemCache
         elif cache_type.lower() in ("red", "redis"):
             self.__class__ = RedisCache
+        elif cache_type.lower() in ("tier", "tiered"):
+            self.__class__ = TieredCache
+        elif cache_type.lower() in ("shm", "shared"):
+            self.__class__ = ShmCache
         else:
             raise ValueError("指定的缓存类型错误")
         self.__init__(app, **kwargs)
+        if app is not None:
+            self.init_stats(app)
 
     def get(self, *arg, **kwargs):
         pass
 
 
-class MemCache(SimpleCache):
+class LRUStore:
+    """
+    内存存储，按LRU淘汰，过期时间由最小堆驱动
+    读写均不需要遍历全部数据，写入时只弹出堆顶已过期的项
+    设置了max_bytes时按键和值的字节数计算占用，超出后按LRU淘汰，不再限制条目数
+    """
+    def __init__(self, threshold=1000, max_bytes=0, max_item_bytes=0):
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.nbytes = 0
+        self._data = OrderedDict()      # key -> (expires, value)，按访问先后排序
+        self._expires = []              # (expires, key)最小堆，覆盖写入后的旧记录惰性删除
+
+    def __len__(self):
+        return len(self._data)
+
+    @staticmethod
+    def _size(key, item):
+        return len(key) + len(item[1])
+
+    def get(self, key, now=None):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires = item[0]
+        if expires and expires <= (now or time()):
+            self.pop(key)
+            return None
+        self._data.move_to_end(key)
+        return item
+
+    def set(self, key, item, now=None):
+        size = self._size(key, item)
+        if self.max_item_bytes and size > self.max_item_bytes:
+            self.pop(key)
+            return False
+        self.pop(key)
+        self._data[key] = item
+        self.nbytes += size
+        if item[0]:
+            heappush(self._expires, (item[0], key))
+        self._evict(now or time())
+        return True
+
+    def pop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.nbytes -= self._size(key, item)
+        return item
+
+    def clear(self):
+        self._data.clear()
+        self._expires.clear()
+        self.nbytes = 0
+
+    def keys(self):
+        return list(self._data.keys())
+
+    def items(self):
+        return list(self._data.items())
+
+    def _evict(self, now):
+        # 先清理已过期的项，堆中的记录与当前值的过期时间不一致时说明已被覆盖，直接丢弃
+        expires = self._expires
+        while expires and expires[0][0] <= now:
+            ts, key = heappop(expires)
+            item = self._data.get(key)
+            if item is not None and item[0] == ts:
+                self.pop(key)
+        # 再按LRU淘汰超出字节数或条目数上限的项
+        if self.max_bytes:
+            while self.nbytes > self.max_bytes:
+                key, item = self._data.popitem(last=False)
+                self.nbytes -= self._size(key, item)
+        else:
+            while len(self._data) > self.threshold:
+                key, item = self._data.popitem(last=False)
+                self.nbytes -= self._size(key, item)
+        # 被覆盖的旧记录过多时重建堆，避免堆无限增长
+        if len(expires) > 2 * len(self._data) + 1024:
+            self._expires = [(item[0], key) for key, item in self._data.items() if item[0]]
+            heapify(self._expires)
+
+
+class NamespaceMixin:
+    """
+    命名空间：每个命名空间保存一个版本号，并拼接到该空间下的每个键中
+    版本号加一后旧版本的键不再被访问，随过期时间或LRU自然淘汰，因此清除整组缓存只需一次自增
+    """
+    NAMESPACE_PREFIX = "namespace_"
+
+    def namespace_version(self, namespace):
+        version_key = self.NAMESPACE_PREFIX + namespace
+        version = self.get(version_key)
+        if version is None:
+            # 版本号丢失后以当前毫秒时间重新开始，避免回到旧版本而读到失效的数据
+            # 固定使用json编码，redis中保存为纯数字，invalidate_namespace可以直接用INCR自增
+            self.add(version_key, int(time() * 1000), timeout=0, codec="json")
+            version = self.get(version_key)
+        return version
+
+    def namespace_key(self, namespace, key):
+        """生成命名空间下的键，例如cache.get(cache.namespace_key("user:42", "profile"))"""
+        return f"{namespace}:{self.namespace_version(namespace)}:{key}"
+
+    def invalidate_namespace(self, namespace):
+        """使命名空间下的所有键失效"""
+        return self.inc(self.NAMESPACE_PREFIX + namespace)
+
+
+class MemoizeMixin:
+    """
+    函数和视图缓存装饰器，带有防击穿保护：
+    单飞锁保证同一时间只有一个调用方重新计算，其他调用方返回旧值或等待结果；
+    按剩余时间和计算耗时概率性提前刷新；缓存时间加入随机抖动，避免大量键同时过期
+    """
+    def _cached_call(self, key, func, timeout, jitter, beta, lock_timeout, cache_if=None):
+        lock_key = key + "_lock"
+        entry = self.get(key)
+        if entry is not None:
+            value, expires, delta = entry
+            if time() - delta * beta * log(1 - random()) < expires:
+                return value
+            if not self.add(lock_key, 1, timeout=lock_timeout):     # 已有调用方在刷新，先返回旧值
+                return value
+        elif not self.add(lock_key, 1, timeout=lock_timeout):
+            deadline = time() + lock_timeout
+            while time() < deadline:
+                _wait(0.05)
+                entry = self.get(key)
+                if entry is not None:
+                    return entry[0]
+            return func()   # 等待超时，不再等待其他调用方的结果
+
+        try:
+            start = time()
+            value = func()
+            delta = time() - start
+            if cache_if is None or cache_if(value):
+                ttl = max(int(timeout * (1 - jitter * random())), 1)
+                self.set(key, [value, time() + ttl, delta], timeout=ttl)
+            return value
+        finally:
+            self.delete(lock_key)
+
+    def memoize(self, timeout=300, jitter=0.1, beta=1.0, lock_timeout=10):
+        """
+        缓存函数返回值，缓存键由函数名和参数生成
+        :param timeout: 缓存时间，秒
+        :param jitter: 缓存时间的随机缩减比例
+        :param beta: 提前刷新的倾向，越大越早刷新，0表示不提前刷新
+        :param lock_timeout: 单飞锁的超时时间，秒
+        """
+        def decorator(func):
+            prefix = f"memoize_{func.__module__}.{func.__qualname__}_"
+
+            def make_key(*args, **kwargs):
+                return prefix + md5(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                return self._cached_call(make_key(*args, **kwargs), partial(func, *args, **kwargs),
+                                         timeout, jitter, beta, lock_timeout)
+
+            wrapper.invalidate = lambda *args, **kwargs: self.delete(make_key(*args, **kwargs))
+            return wrapper
+        return decorator
+
+    def cached_view(self, timeout=60, key_func=None, jitter=0.1, beta=1.0, lock_timeout=10):
+        """
+        缓存视图函数的响应，只缓存状态码为200的响应
+        默认的缓存键由请求方法、路径、参数和用户ID生成，用于need_login的接口时需要放在need_login装饰器之下
+        :param key_func: 自定义缓存键的生成函数
+        """
+        def decorator(func):
+            def default_key():
+                params = json.dumps(dict(g.get("request_data") or {}), sort_keys=True, default=str)   # 请求参数可能是延迟解析的Mapping，先转为字典
+                return md5(f"{request.method}|{request.path}|{params}|{g.get('user_id', '')}".encode()).hexdigest()
+
+            def render(*args, **kwargs):
+                response = make_response(func(*args, **kwargs))
+                return [response.get_data(as_text=True), response.status_code, response.mimetype]
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                key = f"view_{request.endpoint}_{key_func() if key_func else default_key()}"
+                body, status, mimetype = self._cached_call(key, partial(render, *args, **kwargs), timeout, jitter,
+                                                           beta, lock_timeout, cache_if=lambda rv: rv[1] == 200)
+                return current_app.response_class(body, status=status, mimetype=mimetype)
+            return wrapper
+        return decorator
+
+
+class StatsMixin:
+    """缓存操作统计：按键的逻辑前缀（如user_token_）和操作类型记录次数、命中率、耗时和数据量"""
+    STATS_OPS = ("get", "get_and_touch", "set", "add", "delete", "has", "inc", "dec")
+    _op_stats = None
+
+    def init_stats(self, app):
+        if not app.config.get("CACHE_STATS"):
+            return
+        self._op_stats = dict()
+        self.codec.track_bytes = True
+        for op in self.STATS_OPS:
+            setattr(self, op, self._instrument(op, getattr(self.__class__, op).__get__(self)))
+        stats_url = app.config.get("CACHE_STATS_URL")
+        if stats_url:
+            app.add_url_rule(stats_url, endpoint=f"{app.name}_cache_stats", view_func=lambda: jsonify(self.stats()))
+
+    def _instrument(self, op, func):
+        @wraps(func)
+        def wrapper(key, *args, **kwargs):
+            self.codec.last_bytes(reset=True)
+            start = perf_counter()
+            result = func(key, *args, **kwargs)
+            elapsed = perf_counter() - start
+
+            prefix = RE_KEY_VARIABLE.sub("*", key)
+            stat = self._op_stats.get((prefix, op))
+            if stat is None:
+                if len(self._op_stats) >= STATS_MAX_PREFIXES:
+                    prefix = "*"
+                stat = self._op_stats.setdefault((prefix, op), [0, 0, 0, 0.0, 0])     # 次数，命中，未命中，耗时，字节数
+            stat[0] += 1
+            stat[3] += elapsed
+            if op in ("get", "get_and_touch", "has"):
+                stat[1 if result else 2] += 1
+            if op in ("get", "get_and_touch", "set", "add"):
+                stat[4] += self.codec.last_bytes()
+            return result
+        return wrapper
+
+    def _entry_stats(self):
+        """返回缓存的条目数和占用字节数"""
+        return None, None
+
+    def stats(self):
+        """返回各前缀各操作的统计数据，以及缓存的条目数和占用字节数"""
+        ops = []
+        for (prefix, op), (count, hits, misses, elapsed, nbytes) in sorted((self._op_stats or dict()).items()):
+            ops.append({
+                "prefix": prefix, "op": op, "count": count, "hits": hits, "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0,
+                "avg_ms": round(elapsed / count * 1000, 3), "bytes": nbytes
+            })
+        entries, nbytes = self._entry_stats()
+        return {"type": self.__class__.__name__, "entries": entries, "bytes": nbytes, "ops": ops}
+
+
+# 内存缓存快照文件格式
+SNAPSHOT_MAGIC = b"PYAPISNP"
+SNAPSHOT_HEADER = struct.Struct("<8sQ")     # magic, 条目数
+SNAPSHOT_ITEM = struct.Struct("<dII")       # 过期时间, 键长度, 值长度
+
+SKIPLIST_MAXLEVEL = 32
+SKIPLIST_P = 0.25
+
+
+def _encode_member(value):
+    """按redis客户端的规则把成员转为bytes，保证与RedisCache返回的成员类型一致"""
+    if isinstance(value, bytes):
+        return value
+    elif isinstance(value, bool):
+        raise TypeError("Invalid input of type: 'bool'")
+    elif isinstance(value, (int, float)):
+        return repr(value).encode()
+    return str(value).encode()
+
+
+def _parse_score_bound(value):
+    """解析分数范围，支持-inf、+inf和以(开头的开区间，返回(score, 是否开区间)"""
+    if isinstance(value, bytes):
+        value = value.decode()
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("("):
+            return float(value[1:]), True
+        return float(value), False
+    return float(value), False
+
+
+class _SkipNode:
+    __slots__ = ("member", "score", "forward", "span", "backward")
+
+    def __init__(self, level, score, member):
+        self.member = member
+        self.score = score
+        self.forward = [None] * level
+        self.span = [0] * level
+        self.backward = None
+
+
+class SortedSet:
+    """
+    有序集合，使用带跨度的跳表实现，与redis的zset结构相同
+    按(分数, 成员)排序，插入、删除、排名和范围定位均为O(log n)
+    """
+    def __init__(self):
+        self.scores = dict()
+        self.level = 1
+        self.head = _SkipNode(SKIPLIST_MAXLEVEL, 0, None)
+        self.tail = None
+
+    def __len__(self):
+        return len(self.scores)
+
+    @staticmethod
+    def _random_level():
+        level = 1
+        while random() < SKIPLIST_P and level < SKIPLIST_MAXLEVEL:
+            level += 1
+        return level
+
+    def insert(self, score, member):
+        update = [self.head] * SKIPLIST_MAXLEVEL
+        rank = [0] * SKIPLIST_MAXLEVEL
+        x = self.head
+        for i in range(self.level - 1, -1, -1):
+            rank[i] = 0 if i == self.level - 1 else rank[i + 1]
+            while x.forward[i] and (x.forward[i].score, x.forward[i].member) < (score, member):
+                rank[i] += x.span[i]
+                x = x.forward[i]
+            update[i] = x
+        level = self._random_level()
+        if level > self.level:
+            for i in range(self.level, level):
+                self.head.span[i] = len(self.scores)
+            self.level = level
+        x = _SkipNode(level, score, member)
+        for i in range(level):
+            x.forward[i] = update[i].forward[i]
+            update[i].forward[i] = x
+            x.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self.level):
+            update[i].span[i] += 1
+        x.backward = None if update[0] is self.head else update[0]
+        if x.forward[0]:
+            x.forward[0].backward = x
+        else:
+            self.tail = x
+        self.scores[member] = score
+
+    def delete(self, member):
+        score = self.scores.pop(member, None)
+        if score is None:
+            return False
+        update = [self.head] * SKIPLIST_MAXLEVEL
+        x = self.head
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] and (x.forward[i].score, x.forward[i].member) < (score, member):
+                x = x.forward[i]
+            update[i] = x
+        x = x.forward[0]
+        for i in range(self.level):
+            if update[i].forward[i] is x:
+                update[i].span[i] += x.span[i] - 1
+                update[i].forward[i] = x.forward[i]
+            else:
+                update[i].span[i] -= 1
+        if x.forward[0]:
+            x.forward[0].backward = x.backward
+        else:
+            self.tail = x.backward
+        while self.level > 1 and self.head.forward[self.level - 1] is None:
+            self.level -= 1
+        return True
+
+    def update(self, member, score):
+        if member in self.scores:
+            self.delete(member)
+        self.insert(score, member)
+
+    def rank(self, member):
+        """返回从0开始的升序排名，成员不存在时返回None"""
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        rank, x = 0, self.head
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] and (x.forward[i].score, x.forward[i].member) <= (score, member):
+                rank += x.span[i]
+                x = x.forward[i]
+            if x is not self.head and x.member == member:
+                return rank - 1
+        return None
+
+    def node_by_rank(self, rank):
+        """按从0开始的升序排名定位节点"""
+        traversed, x = 0, self.head
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] and traversed + x.span[i] <= rank + 1:
+                traversed += x.span[i]
+                x = x.forward[i]
+            if traversed == rank + 1:
+                return x
+        return None
+
+    def first_in_range(self, min_score, min_exclusive=False):
+        """定位第一个分数不小于（开区间时大于）min_score的节点"""
+        x = self.head
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] and (x.forward[i].score < min_score or (min_exclusive and x.forward[i].score == min_score)):
+                x = x.forward[i]
+        return x.forward[0]
+
+    def range_by_rank(self, start, end, desc=False):
+        """返回排名在[start, end]之间的(member, score)，支持负数下标"""
+        length = len(self.scores)
+        start = start + length if start < 0 else start
+        end = end + length if end < 0 else end
+        start, end = max(start, 0), min(end, length - 1)
+        if start > end:
+            return []
+        x = self.node_by_rank(length - 1 - start if desc else start)
+        result = []
+        for _ in range(end - start + 1):
+            result.append((x.member, x.score))
+            x = x.backward if desc else x.forward[0]
+        return result
+
+    def range_by_score(self, min_score, max_score, start=None, num=None):
+        """返回分数在[min_score, max_score]之间的(member, score)，start和num用来分页"""
+        min_score, min_exclusive = _parse_score_bound(min_score)
+        max_score, max_exclusive = _parse_score_bound(max_score)
+        x = self.first_in_range(min_score, min_exclusive)
+        skip = start or 0
+        result = []
+        while x and (x.score < max_score or (x.score == max_score and not max_exclusive)):
+            if num is not None and 0 <= num <= len(result):
+                break
+            if skip:
+                skip -= 1
+            else:
+                result.append((x.member, x.score))
+            x = x.forward[0]
+        return result
+
+
+class MemCache(NamespaceMixin, MemoizeMixin, StatsMixin):
     """内存缓存"""
-    def __init__(self, app=None, key_prefix="", key_timeout=None, threshold=1000):
-        super().__init__(threshold)
+    def __init__(self, app=None, key_prefix="", key_timeout=None, threshold=None, max_bytes=None, max_item_bytes=None):
+        self._store = LRUStore(threshold or 1000, max_bytes or 0, max_item_bytes or 0)
+        self._zsets = dict()
+        self.codec = Codec()
         self.key_prefix = key_prefix+"_" if key_prefix else ""
         self.key_timeout = key_timeout if key_timeout else 0
+        self.snapshot_path = ""
+        self.snapshot_interval = 0
+        self._snapshot_pid = None
         self.app = app
         if app is not None:
-            self.init_app(app, key_prefix, key_timeout, threshold)
+            self.init_app(app, key_prefix, key_timeout, threshold, max_bytes, max_item_bytes)
 
-    def init_app(self, app, key_prefix="", key_timeout=None, threshold=1000):
-        self._threshold = threshold
+    def init_app(self, app, key_prefix="", key_timeout=None, threshold=None, max_bytes=None, max_item_bytes=None):
+        self._store.threshold = threshold if threshold else app.config.get("CACHE_THRESHOLD", self._store.threshold)
+        self._store.max_bytes = max_bytes if max_bytes else app.config.get("CACHE_MAX_BYTES", self._store.max_bytes)
+        self._store.max_item_bytes = max_item_bytes if max_item_bytes else app.config.get("CACHE_MAX_ITEM_BYTES", self._store.max_item_bytes)
+        self.codec.init_app(app)
         self.key_prefix = f"{app.name}_{key_prefix+"_" if key_prefix else self.key_prefix}"
         self.key_timeout = key_timeout if key_timeout else self.key_timeout
 
+        if app.config.get("CACHE_SNAPSHOT"):
+            self.app = app
+            self.snapshot_path = app.config.get("CACHE_SNAPSHOT_PATH") or os.path.join(tempfile.gettempdir(), f"{app.name}_cache.snapshot")
+            self.snapshot_interval = app.config.get("CACHE_SNAPSHOT_INTERVAL", self.snapshot_interval)
+            self.load_snapshot()
+            self._register_shutdown()
+
+    def _register_shutdown(self):
+        """正常退出时保存快照，uWSGI下使用其退出钩子"""
+        try:
+            import uwsgi
+        except ImportError:
+            atexit.register(self.save_snapshot)
+            return
+        previous = getattr(uwsgi, "atexit", None)
+
+        def on_exit():
+            self.save_snapshot()
+            if previous is not None:
+                previous()
+        uwsgi.atexit = on_exit
+
+    def _start_snapshot_timer(self):
+        # 定时保存的线程需要在各自的工作进程中启动
+        self._snapshot_pid = os.getpid()
+
+        def run():
+            while True:
+                sleep(self.snapshot_interval)
+                self.save_snapshot()
+        threading.Thread(target=run, name="cache-snapshot", daemon=True).start()
+
+    def save_snapshot(self, path=None):
+        """
+        把未过期的数据按LRU顺序写入快照文件，先写临时文件再替换，多个进程同时保存也不会写坏
+        格式：文件头(magic, 条目数) | 每个条目的(过期时间, 键长度, 值长度) + 键 + 值
+        """
+        path = path or self.snapshot_path
+        if not path:
+            return 0
+        now = time()
+        try:
+            items = [(key, item) for key, item in self._store.items() if not item[0] or item[0] > now]
+        except RuntimeError:    # 其他线程正在修改，等下次再保存
+            return 0
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(items)))
+                for key, (expires, value) in items:
+                    key = key.encode()
+                    f.write(SNAPSHOT_ITEM.pack(expires, len(key), len(value)))
+                    f.write(key)
+                    f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            if self.app is not None:
+                self.app.logger.error(f"缓存快照保存失败：{path}, {e}")
+            return 0
+        return len(items)
+
+    def load_snapshot(self, path=None):
+        """通过mmap读取快照文件，跳过已过期的条目，文件损坏时只记录日志"""
+        path = path or self.snapshot_path
+        if not path or not os.path.isfile(path) or not os.path.getsize(path):
+            return 0
+        now = time()
+        loaded = 0
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                magic, count = SNAPSHOT_HEADER.unpack_from(mm, 0)
+                if magic != SNAPSHOT_MAGIC:
+                    raise ValueError("invalid snapshot header")
+                offset = SNAPSHOT_HEADER.size
+                for _ in range(count):
+                    expires, key_len, value_len = SNAPSHOT_ITEM.unpack_from(mm, offset)
+                    offset += SNAPSHOT_ITEM.size
+                    if not expires or expires > now:
+                        key = mm[offset:offset + key_len].decode()
+                        self._store.set(key, (expires, mm[offset + key_len:offset + key_len + value_len]), now)
+                        loaded += 1
+                    offset += key_len + value_len
+        except (OSError, ValueError, struct.error) as e:
+            if self.app is not None:
+                self.app.logger.error(f"缓存快照读取失败：{path}, {e}")
+        if self.app is not None:
+            self.app.logger.info(f"缓存快照已加载：{path}, {loaded}个")
+        return loaded
+
     def _normalize_timeout(self, timeout):
         if timeout is None:
             timeout = self.key_timeout
-        elif timeout <= 0:
-            timeout = 0
-        else:
-            timeout = time() + timeout
-        return timeout
+        if timeout <= 0:
+            return 0
+        return time() + timeout
 
     def _key(self, key, key_prefix=True):
         if self.key_prefix and key_prefix:
@@ -76,45 +769,278 @@ class MemCache(SimpleCache):
         return key
 
     def get(self, key, key_prefix=True):
-        data = self._cache.get(self._key(key, key_prefix))
-        if not data:
+        item = self._store.get(self._key(key, key_prefix))
+        if item is None:
             return None
-        expires, value = data
-        if expires == 0 or expires > time():
-            return load_object(value)
-        return None
+        return self.codec.loads(item[1])
 
-    def set(self, key, value, key_prefix=True, timeout=None):
-        self._prune()
-        self._cache[self._key(key, key_prefix)] = (self._normalize_timeout(timeout), json.dumps(value))
-        return True
+    def get_many(self, *keys, key_prefix=True):
+        return [self.get(key, key_prefix) for key in keys]
+
+    def get_dict(self, *keys, key_prefix=True):
+        return dict(zip(keys, self.get_many(*keys, key_prefix=key_prefix)))
 
-    def add(self, key, value, key_prefix=True, timeout=None):
-        self._prune()
-        if key in self._cache:
+    def set(self, key, value, key_prefix=True, timeout=None, codec=None):
+        if self.snapshot_interval and self._snapshot_pid != os.getpid():
+            self._start_snapshot_timer()
+        return self._store.set(self._key(key, key_prefix), (self._normalize_timeout(timeout), self.codec.dumps(value, codec)))
+
+    def add(self, key, value, key_prefix=True, timeout=None, codec=None):
+        key = self._key(key, key_prefix)
+        if self._store.get(key) is not None:
             return False
-        item = (self._normalize_timeout(timeout), json.dumps(value))
-        self._cache.setdefault(self._key(key, key_prefix), item)
+        return self._store.set(key, (self._normalize_timeout(timeout), self.codec.dumps(value, codec)))
+
+    def set_many(self, mapping, timeout=None, key_prefix=True, codec=None):
+        for key, value in mapping:
+            self.set(key, value, key_prefix, timeout, codec)
         return True
 
     def delete(self, key, key_prefix=True):
-        return self._cache.pop(self._key(key, key_prefix), None) is not None
+        key = self._key(key, key_prefix)
+        return (self._store.pop(key) is not None) | (self._zsets.pop(key, None) is not None)
+
+    def delete_many(self, *keys, key_prefix=True):
+        return sum(self.delete(key, key_prefix) for key in keys)
 
     def has(self, key, key_prefix=True):
-        data = self._cache.get(self._key(key, key_prefix))
-        if not data:
-            return False
-        expires, value = data
-        return expires == 0 or expires > time()
+        key = self._key(key, key_prefix)
+        return self._store.get(key) is not None or key in self._zsets
+
+    def get_and_touch(self, key, timeout, refresh_ratio=1, key_prefix=True):
+        """读取缓存，剩余有效时间低于timeout*refresh_ratio时把有效时间重置为timeout"""
+        key = self._key(key, key_prefix)
+        now = time()
+        item = self._store.get(key, now)
+        if item is None:
+            return None
+        expires, value = item
+        if expires and expires - now < timeout * refresh_ratio:
+            self._store.set(key, (self._normalize_timeout(timeout), value), now)
+        return self.codec.loads(value)
+
+    def clear(self, key_prefix=True):
+        if self.key_prefix and key_prefix:
+            self.delete_pattern("*")
+        else:
+            self._store.clear()
+            self._zsets.clear()
+        return True
+
+    def iter_keys(self, pattern="*", key_prefix=True):
+        pattern = self._key(pattern, key_prefix)
+        for key in self._store.keys() + list(self._zsets):
+            if fnmatchcase(key, pattern):
+                yield key
+
+    def delete_pattern(self, pattern="*", key_prefix=True):
+        keys = list(self.iter_keys(pattern, key_prefix))
+        for key in keys:
+            self._store.pop(key)
+            self._zsets.pop(key, None)
+        return len(keys)
+
+    def inc(self, key, delta=1, key_prefix=True):
+        key = self._key(key, key_prefix)
+        item = self._store.get(key)
+        expires, value = item if item is not None else (0, None)
+        value = int(self.codec.loads(value) or 0) + delta
+        self._store.set(key, (expires, self.codec.dumps(value, "json")))
+        return value
+
+    def dec(self, key, delta=1, key_prefix=True):
+        return self.inc(key, -delta, key_prefix)
+
+    def _entry_stats(self):
+        return len(self._store), self._store.nbytes
+
+    def memory_usage(self):
+        """返回当前的占用情况"""
+        return {
+            "entries": len(self._store),
+            "bytes": self._store.nbytes,
+            "max_bytes": self._store.max_bytes,
+            "max_item_bytes": self._store.max_item_bytes,
+        }
+
+    def _zset(self, key, key_prefix=True, create=False):
+        key = self._key(key, key_prefix)
+        zset = self._zsets.get(key)
+        if zset is None and create:
+            zset = self._zsets[key] = SortedSet()
+        return zset
+
+    def _zset_drop_empty(self, key, key_prefix=True):
+        key = self._key(key, key_prefix)
+        if key in self._zsets and not self._zsets[key]:
+            del self._zsets[key]
+
+    def zcard(self, key, key_prefix=True):
+        zset = self._zset(key, key_prefix)
+        return len(zset) if zset else 0
+
+    def zadd(self, key, key_prefix=True, mapping=None, nx=False, xx=False, ch=False, incr=False, gt=False, lt=False):
+        if incr and len(mapping) != 1:
+            raise ValueError("ZADD option 'incr' only works when passing a single element/score pair")
+        zset = self._zset(key, key_prefix, create=True)
+        added = changed = 0
+        score = None
+        for member, score in mapping.items():
+            member, score = _encode_member(member), float(score)
+            old = zset.scores.get(member)
+            if old is None:
+                if xx:
+                    score = None
+                    continue
+                zset.insert(score, member)
+                added += 1
+                continue
+            if nx:
+                score = None
+                continue
+            if incr:
+                score += old
+            if (gt and score <= old) or (lt and score >= old):
+                score = None
+                continue
+            if score != old:
+                zset.update(member, score)
+                changed += 1
+        self._zset_drop_empty(key, key_prefix)
+        if incr:
+            return score
+        return added + changed if ch else added
+
+    def zrem(self, key, *name, key_prefix=True,):
+        zset = self._zset(key, key_prefix)
+        if not zset:
+            return 0
+        removed = sum(zset.delete(_encode_member(member)) for member in name)
+        self._zset_drop_empty(key, key_prefix)
+        return removed
+
+    def zincrby(self, key, name, amount=1, key_prefix=True):
+        zset = self._zset(key, key_prefix, create=True)
+        member = _encode_member(name)
+        score = zset.scores.get(member, 0.0) + float(amount)
+        zset.update(member, score)
+        return score
+
+    def zrank(self, key, name, desc=False, key_prefix=True):
+        zset = self._zset(key, key_prefix)
+        if not zset:
+            return None
+        rank = zset.rank(_encode_member(name))
+        if rank is not None and desc:
+            rank = len(zset) - 1 - rank
+        return rank
+
+    def zscore(self, key, name, key_prefix=True):
+        zset = self._zset(key, key_prefix)
+        return zset.scores.get(_encode_member(name)) if zset else None
+
+    def zrange(self, key, start, end, key_prefix=True, desc=False, withscores=False, score_cast_func=float):
+        zset = self._zset(key, key_prefix)
+        items = zset.range_by_rank(start, end, desc) if zset else []
+        if withscores:
+            return [(member, score_cast_func(score)) for member, score in items]
+        return [member for member, _ in items]
+
+    def zrangebyscore(self, key, min_score, max_score, start=None, num=None, key_prefix=True, withscores=False, score_cast_func=float):
+        if (start is None) != (num is None):
+            raise ValueError("``start`` and ``num`` must both be specified")
+        zset = self._zset(key, key_prefix)
+        items = zset.range_by_score(min_score, max_score, start, num) if zset else []
+        if withscores:
+            return [(member, score_cast_func(score)) for member, score in items]
+        return [member for member, _ in items]
+
+    def zremrangebyscore(self, key, min_score, max_score, key_prefix=True):
+        zset = self._zset(key, key_prefix)
+        if not zset:
+            return 0
+        removed = sum(zset.delete(member) for member, _ in zset.range_by_score(min_score, max_score))
+        self._zset_drop_empty(key, key_prefix)
+        return removed
+
+
+# 读取缓存并在剩余有效时间不足时续期，没有过期时间的键不处理
+GET_AND_TOUCH_SCRIPT = """
+local value = redis.call("GET", KEYS[1])
+if value then
+    local ttl = redis.call("TTL", KEYS[1])
+    if ttl >= 0 and ttl < tonumber(ARGV[2]) then
+        redis.call("EXPIRE", KEYS[1], ARGV[1])
+    end
+end
+return value
+"""
+
+# 请求内自动批量模式下可以延后发送的写命令，这些命令的返回值通常不会被使用
+DEFERRABLE_COMMANDS = {"SET", "SETEX", "DEL", "UNLINK", "EXPIRE", "PUBLISH"}
+
+
+def _count_round_trip():
+    if has_request_context():
+        g.cache_round_trips = g.get("cache_round_trips", 0) + 1
+
+
+@lru_cache(maxsize=None)
+def _redis_client_class():
+    """
+    生成redis客户端类，统计每个请求中与redis的交互次数
+    开启auto_pipeline时，请求内的写命令暂存到pipeline中，在下一次读取前或请求结束时一起发送
+    """
+    redis = _import_module("redis")
+
+    class CountingPipeline(redis.client.Pipeline):
+        def execute(self, raise_on_error=True):
+            if self.command_stack:
+                _count_round_trip()
+            return super().execute(raise_on_error)
 
+    class RequestRedis(redis.StrictRedis):
+        auto_pipeline = False
 
-class RedisCache:
+        def pipeline(self, transaction=True, shard_hint=None):
+            # 直接使用的pipeline立即执行，先发送暂存的写命令，避免暂存的旧命令在请求结束时覆盖新的写入
+            self.flush_pipeline()
+            return self._new_pipeline(transaction, shard_hint)
+
+        def _new_pipeline(self, transaction=True, shard_hint=None):
+            return CountingPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+        def execute_command(self, *args, **options):
+            if self.auto_pipeline and has_request_context():
+                pipe = g.get("cache_pipeline")
+                if args[0] in DEFERRABLE_COMMANDS and "NX" not in args:
+                    if pipe is None:
+                        pipe = g.cache_pipeline = self._new_pipeline(transaction=False)
+                    pipe.execute_command(*args, **options)
+                    return True
+                if pipe is not None and pipe.command_stack:     # 读取前先发送暂存的写命令，保证能读到自己的写入
+                    pipe.execute()
+            _count_round_trip()
+            return super().execute_command(*args, **options)
+
+        def flush_pipeline(self):
+            pipe = g.pop("cache_pipeline", None) if has_request_context() else None
+            if pipe is not None and pipe.command_stack:
+                return pipe.execute()
+
+    return RequestRedis
+
+
+class RedisCache(NamespaceMixin, MemoizeMixin, StatsMixin):
     """redis缓存"""
     def __init__(self, app=None, redis_uri="", key_prefix="", key_timeout=None, **kwargs):
         self.redis_uri = 'redis://localhost:6379/0'
         self._client = None
+        self.codec = Codec()
         self.key_prefix = key_prefix+"_" if key_prefix else ""
         self.key_timeout = key_timeout if key_timeout else -1
+        self.scan_batch_size = 500
+        self.scan_interval = 0
         self.app = app
         if app is not None:
             self.init_app(app, redis_uri, key_prefix, key_timeout, **kwargs)
@@ -123,12 +1049,50 @@ class RedisCache:
         self.redis_uri = redis_uri if redis_uri else app.config.get("REDIS_URI", self.redis_uri)
         self.key_prefix = f"{app.name}_{key_prefix+"_" if key_prefix else self.key_prefix}"
         self.key_timeout = key_timeout if key_timeout else self.key_timeout
+        self.scan_batch_size = app.config.get("CACHE_SCAN_BATCH_SIZE", self.scan_batch_size)
+        self.scan_interval = app.config.get("CACHE_SCAN_INTERVAL", self.scan_interval)
+        self.codec.init_app(app)
 
         try:
             import redis
         except ImportError:
             raise RuntimeError("Redis module not found")
-        self._client = redis.StrictRedis.from_url(self.redis_uri, **kwargs)
+        # 连接池满时等待空闲连接而不是直接报错，适合gevent下大量协程共用少量连接
+        pool_kwargs = {
+            "max_connections": app.config.get("CACHE_REDIS_MAX_CONNECTIONS", 50),
+            "timeout": app.config.get("CACHE_REDIS_POOL_TIMEOUT", 5),
+            "socket_timeout": app.config.get("CACHE_REDIS_SOCKET_TIMEOUT", 2),
+            "socket_connect_timeout": app.config.get("CACHE_REDIS_SOCKET_CONNECT_TIMEOUT", 2),
+            "socket_keepalive": True,
+            "health_check_interval": app.config.get("CACHE_REDIS_HEALTH_CHECK_INTERVAL", 30),
+            "retry_on_timeout": True,
+        }
+        pool_kwargs.update(kwargs)
+        pool = redis.BlockingConnectionPool.from_url(self.redis_uri, **pool_kwargs)
+        self._client = _redis_client_class()(connection_pool=pool)
+        self._client.auto_pipeline = app.config.get("CACHE_REDIS_AUTO_PIPELINE", False)
+        self._get_and_touch_script = self._client.register_script(GET_AND_TOUCH_SCRIPT)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _after_request(self, response):
+        self._flush_pipeline()
+        round_trips = g.get("cache_round_trips", 0)
+        if current_app.debug:
+            response.headers["X-Cache-Round-Trips"] = str(round_trips)
+        current_app.logger.debug(f"缓存交互次数：{request.path}, {round_trips}")
+        return response
+
+    def _teardown_request(self, error=None):
+        # 出现异常时after_request不会执行，这里补充发送暂存的写命令
+        self._flush_pipeline()
+
+    def _flush_pipeline(self):
+        """请求结束时发送暂存的写命令，失败时只记录日志，不影响已经成功的响应"""
+        try:
+            self._client.flush_pipeline()
+        except Exception as e:
+            current_app.logger.error(f"缓存暂存的写命令发送失败：{e}")
 
     def _normalize_timeout(self, timeout):
         if timeout is None:
@@ -143,41 +1107,38 @@ class RedisCache:
         return key
 
     def get(self, key, key_prefix=True):
-        return load_object(self._client.get(self._key(key, key_prefix)))
+        return self.codec.loads(self._client.get(self._key(key, key_prefix)))
 
     def get_many(self, *keys, key_prefix=True):
         keys = [self._key(key, key_prefix) for key in keys]
-        return [load_object(x) for x in self._client.mget(keys)]
+        return [self.codec.loads(x) for x in self._client.mget(keys)]
 
     def get_dict(self, *keys, key_prefix=True):
         keys = [self._key(key, key_prefix) for key in keys]
         return dict(zip(keys, self.get_many(*keys)))
 
-    def set(self, key, value, timeout=None, key_prefix=True):
+    def set(self, key, value, timeout=None, key_prefix=True, codec=None):
         key = self._key(key, key_prefix)
         timeout = self._normalize_timeout(timeout)
-        value = json.dumps(value)
+        value = self.codec.dumps(value, codec)
         if timeout == -1:
             result = self._client.set(name=key, value=value)
         else:
             result = self._client.setex(name=key, value=value, time=timeout)
         return result
 
-    def add(self, key, value, timeout=None, key_prefix=True):
+    def add(self, key, value, timeout=None, key_prefix=True, codec=None):
         key = self._key(key, key_prefix)
         timeout = self._normalize_timeout(timeout)
-        value = json.dumps(value)
-        return (
-            self._client.setnx(name=key, value=value) and
-            self._client.expire(name=key, time=timeout)
-        )
+        value = self.codec.dumps(value, codec)
+        return bool(self._client.set(name=key, value=value, nx=True, ex=None if timeout == -1 else timeout))
 
-    def set_many(self, mapping, timeout=None, transaction=False, key_prefix=True):
+    def set_many(self, mapping, timeout=None, transaction=False, key_prefix=True, codec=None):
         timeout = self._normalize_timeout(timeout)
         pipe = self._client.pipeline(transaction=transaction)
         for key, value in mapping:
             key = self._key(key, key_prefix)
-            value = json.dumps(value)
+            value = self.codec.dumps(value, codec)
             if timeout == -1:
                 pipe.set(name=key, value=value)
             else:
@@ -196,22 +1157,71 @@ class RedisCache:
     def has(self, key, key_prefix=True):
         return self._client.exists(self._key(key, key_prefix))
 
+    def get_and_touch(self, key, timeout, refresh_ratio=1, key_prefix=True):
+        """读取缓存，剩余有效时间低于timeout*refresh_ratio时把有效时间重置为timeout，在redis中通过脚本一次完成"""
+        value = self._get_and_touch_script(keys=[self._key(key, key_prefix)], args=[int(timeout), int(timeout * refresh_ratio)])
+        return self.codec.loads(value)
+
     def clear(self, key_prefix=True):
         status = False
         if self.key_prefix and key_prefix:
-            keys = self._client.keys(self.key_prefix + '*')
-            if keys:
-                status = self._client.delete(*keys)
+            status = self.delete_pattern("*")
         else:
             status = self._client.flushdb()
         return status
 
+    def iter_keys(self, pattern="*", key_prefix=True, count=None):
+        """使用SCAN游标分批遍历匹配的键，避免KEYS命令长时间阻塞redis"""
+        yield from self._client.scan_iter(match=self._key(pattern, key_prefix), count=count or self.scan_batch_size)
+
+    def delete_pattern(self, pattern="*", key_prefix=True, batch_size=None, interval=None, progress=None):
+        """
+        分批删除匹配的键
+        :param pattern: 键的匹配模式
+        :param key_prefix: 是否添加键前缀
+        :param batch_size: 每批删除的键数量
+        :param interval: 每批之间的间隔时间，秒，用来限制对redis的压力
+        :param progress: 进度回调函数，每批删除后以已删除的数量调用
+        :return: 删除的键数量
+        """
+        batch_size = batch_size or self.scan_batch_size
+        interval = self.scan_interval if interval is None else interval
+        deleted, batch, last_log = 0, [], time()
+        for key in self.iter_keys(pattern, key_prefix, count=batch_size):
+            batch.append(key)
+            if len(batch) < batch_size:
+                continue
+            deleted += self._unlink(batch)
+            batch = []
+            if progress is not None:
+                progress(deleted)
+            if self.app is not None and time() - last_log > 5:
+                last_log = time()
+                self.app.logger.info(f"缓存删除中：{pattern}, 已删除{deleted}个")
+            if interval:
+                sleep(interval)
+        if batch:
+            deleted += self._unlink(batch)
+            if progress is not None:
+                progress(deleted)
+        return deleted
+
+    def _unlink(self, keys):
+        # UNLINK在后台线程释放内存，每条命令最多100个键，通过pipeline一次发送
+        pipe = self._client.pipeline(transaction=False)
+        for i in range(0, len(keys), 100):
+            pipe.unlink(*keys[i:i + 100])
+        return sum(pipe.execute())
+
     def inc(self, key, delta=1, key_prefix=True):
         return self._client.incr(self._key(key, key_prefix), delta)
 
     def dec(self, key, delta=1, key_prefix=True):
         return self._client.decr(self._key(key, key_prefix), delta)
 
+    def _entry_stats(self):
+        return self._client.dbsize(), self._client.info("memory").get("used_memory")
+
     def zcard(self, key, key_prefix=True):
         return self._client.zcard(self._key(key, key_prefix))
 
@@ -222,7 +1232,7 @@ class RedisCache:
         return self._client.zrem(self._key(key, key_prefix), *name)
 
     def zincrby(self, key, name, amount=1, key_prefix=True):
-        return self._client.zincrby(self._key(key, key_prefix), name, amount)
+        return self._client.zincrby(self._key(key, key_prefix), amount, name)
 
     def zrank(self, key, name, desc=False, key_prefix=True):
         key = self._key(key, key_prefix)
@@ -238,3 +1248,633 @@ class RedisCache:
 
     def zrangebyscore(self, key, min_score, max_score, start=None, num=None, key_prefix=True, withscores=False, score_cast_func=float):
         return self._client.zrangebyscore(self._key(key, key_prefix), min_score, max_score, start, num, withscores, score_cast_func)
+
+    def zremrangebyscore(self, key, min_score, max_score, key_prefix=True):
+        return self._client.zremrangebyscore(self._key(key, key_prefix), min_score, max_score)
+
+
+class TieredCache(RedisCache):
+    """
+    两级缓存：进程内的LRU缓存（L1）在前，redis缓存（L2）在后
+    写入和删除时通过redis发布订阅通知其他进程清除各自的L1数据
+    """
+    def __init__(self, app=None, redis_uri="", key_prefix="", key_timeout=None, l1_threshold=None, l1_timeout=None, **kwargs):
+        self._local = LRUStore(l1_threshold or 1000)
+        self._pending = deque()     # 监听线程收到的失效通知，由请求中的读写操作取出执行，L1只在请求中修改，不需要加锁
+        self.local_timeout = l1_timeout if l1_timeout else 5
+        self.channel = ""
+        self._node_id = uuid.uuid4().hex
+        self._listener = None
+        self._listener_pid = None
+        self.l1_hits = self.l2_hits = self.misses = 0
+        super().__init__(app, redis_uri, key_prefix, key_timeout, **kwargs)
+
+    def init_app(self, app, redis_uri="", key_prefix="", key_timeout=None, l1_threshold=None, l1_timeout=None, **kwargs):
+        super().init_app(app, redis_uri, key_prefix, key_timeout, **kwargs)
+        self._local.threshold = l1_threshold if l1_threshold else app.config.get("CACHE_L1_THRESHOLD", self._local.threshold)
+        self.local_timeout = l1_timeout if l1_timeout else app.config.get("CACHE_L1_TIMEOUT", self.local_timeout)
+        self.channel = f"{self.key_prefix}cache_invalidate"
+
+    def _ensure_listener(self):
+        # uWSGI等预先fork的场景下，监听线程必须在各自的工作进程中启动
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        self._listener_pid = pid
+        self._pending.clear()
+        self._local.clear()
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: self._on_invalidate})
+        self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=self._on_listener_error)
+
+    def _on_invalidate(self, message):
+        # 在监听线程中执行，只把通知放入队列
+        data = load_object(message.get("data"))
+        if not data or data.get("n") == self._node_id:
+            return
+        self._pending.append(data.get("k") or [])
+
+    def _on_listener_error(self, error, pubsub, thread):
+        # 连接中断期间可能漏掉失效通知，清空L1保证不会读到过期数据
+        self._pending.append("*")
+        sleep(1)
+
+    def _apply_pending(self):
+        while self._pending:
+            self._local_drop(self._pending.popleft())
+
+    def _publish(self, keys):
+        self._local_drop(keys)
+        self._client.publish(self.channel, json.dumps({"n": self._node_id, "k": keys}))
+
+    def _local_drop(self, keys):
+        if keys == "*":
+            self._local.clear()
+        else:
+            for key in keys:
+                self._local.pop(key)
+
+    def _local_set(self, key, value):
+        if value is not None:
+            self._local.set(key, (time() + self.local_timeout, value))
+
+    def get(self, key, key_prefix=True):
+        self._ensure_listener()
+        if self._pending:
+            self._apply_pending()
+        key = self._key(key, key_prefix)
+        item = self._local.get(key)
+        if item is not None:
+            self.l1_hits += 1
+            return self.codec.loads(item[1])
+        value = self._client.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.l2_hits += 1
+        self._local_set(key, value)
+        return self.codec.loads(value)
+
+    def get_and_touch(self, key, timeout, refresh_ratio=1, key_prefix=True):
+        """
+        L1命中时直接返回，不访问redis；L1过期后的下一次读取经过redis，同时按剩余时间续期
+        续期窗口不大于L1有效时间时每次都经过redis，避免redis中的键在L1有效期内过期
+        """
+        if timeout * refresh_ratio <= self.local_timeout:
+            return super().get_and_touch(key, timeout, refresh_ratio, key_prefix)
+        self._ensure_listener()
+        if self._pending:
+            self._apply_pending()
+        key = self._key(key, key_prefix)
+        item = self._local.get(key)
+        if item is not None:
+            self.l1_hits += 1
+            return self.codec.loads(item[1])
+        value = self._get_and_touch_script(keys=[key], args=[int(timeout), int(timeout * refresh_ratio)])
+        if value is None:
+            self.misses += 1
+            return None
+        self.l2_hits += 1
+        self._local_set(key, value)
+        return self.codec.loads(value)
+
+    def get_many(self, *keys, key_prefix=True):
+        return [self.get(key, key_prefix) for key in keys]
+
+    def set(self, key, value, timeout=None, key_prefix=True, codec=None):
+        result = super().set(key, value, timeout, key_prefix, codec)
+        self._publish([self._key(key, key_prefix)])
+        return result
+
+    def add(self, key, value, timeout=None, key_prefix=True, codec=None):
+        result = super().add(key, value, timeout, key_prefix, codec)
+        if result:
+            self._publish([self._key(key, key_prefix)])
+        return result
+
+    def set_many(self, mapping, timeout=None, transaction=False, key_prefix=True, codec=None):
+        mapping = list(mapping)
+        result = super().set_many(mapping, timeout, transaction, key_prefix, codec)
+        self._publish([self._key(key, key_prefix) for key, _ in mapping])
+        return result
+
+    def delete(self, key, key_prefix=True):
+        result = super().delete(key, key_prefix)
+        self._publish([self._key(key, key_prefix)])
+        return result
+
+    def delete_many(self, *keys, key_prefix=True):
+        result = super().delete_many(*keys, key_prefix=key_prefix)
+        if keys:
+            self._publish([self._key(key, key_prefix) for key in keys])
+        return result
+
+    def clear(self, key_prefix=True):
+        result = super().clear(key_prefix)
+        if not (self.key_prefix and key_prefix):     # 按前缀清除时已经在delete_pattern中通知过
+            self._publish("*")
+        return result
+
+    def delete_pattern(self, pattern="*", key_prefix=True, batch_size=None, interval=None, progress=None):
+        result = super().delete_pattern(pattern, key_prefix, batch_size, interval, progress)
+        self._publish("*")
+        return result
+
+    def inc(self, key, delta=1, key_prefix=True):
+        result = super().inc(key, delta, key_prefix)
+        self._publish([self._key(key, key_prefix)])
+        return result
+
+    def dec(self, key, delta=1, key_prefix=True):
+        result = super().dec(key, delta, key_prefix)
+        self._publish([self._key(key, key_prefix)])
+        return result
+
+    def stats(self):
+        """在操作统计的基础上返回L1/L2的命中情况"""
+        total = self.l1_hits + self.l2_hits + self.misses
+        return {
+            **super().stats(),
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "l1_size": len(self._local),
+            "l1_hit_ratio": round(self.l1_hits / total, 4) if total else 0,
+            "l2_hit_ratio": round(self.l2_hits / total, 4) if total else 0,
+        }
+
+
+# 共享内存文件布局：头部 | 哈希桶数组（每个桶保存链表首项的偏移） | 数据区（按大小分级的块）
+# 每个块按自身大小对齐，数据区中的块首尾相接，可以从任意块的位置顺序解析
+SHM_MAGIC = b"PYAPISHM"
+SHM_VERSION = 2
+SHM_CLASSES = 16                            # 块大小分级，从64字节起每级翻倍，最大2MB
+SHM_MIN_CHUNK = 64
+SHM_EVICT_SCAN = 1024                       # 空间不足时按桶扫描淘汰的最多桶数，仍无可用块时回收整个区域
+SHM_OFF_SEQ = 24                            # 写入序号，写入期间为奇数，读取时据此判断是否需要重读
+SHM_OFF_BUMP = 32                           # 数据区中未分配空间的起始偏移
+SHM_OFF_HAND = 40                           # 空间不足时淘汰扫描的桶位置
+SHM_OFF_FREE = 48                           # 各级空闲块链表的首项偏移
+SHM_OFF_RECLAIM = SHM_OFF_FREE + SHM_CLASSES * 8    # 回收区域时扫描的数据区位置
+SHM_OFF_BUCKETS = 256
+SHM_HEADER = struct.Struct("<8sIIQ")        # magic, version, nbuckets, size
+SHM_ITEM = struct.Struct("<QdHIBB")         # next, expires, key_len, value_len, slab class, 0
+SHM_FREE_ITEM = struct.Struct("<QQ6xBB")    # 空闲块：next, prev, slab class, 1
+SHM_CHUNK_TAG = struct.Struct("<BB")        # 块头部末尾的slab class和空闲标记，已用块和空闲块位置相同
+SHM_U64 = struct.Struct("<Q")
+
+
+class ShmStore:
+    """
+    基于内存映射文件的存储，同一主机上的多个进程共享
+    写入时使用文件锁互斥，读取时不加锁，通过写入序号检测并发修改后重读
+    """
+    def __init__(self, path, size=64 * 1024 * 1024, nbuckets=65536):
+        self._fcntl = _import_module("fcntl")
+        self._lock = threading.RLock()
+        self._depth = 0
+        self.path = path
+        self.size = size
+        self.nbuckets = nbuckets
+        self.data_start = (SHM_OFF_BUCKETS + nbuckets * 8 + SHM_MIN_CHUNK - 1) // SHM_MIN_CHUNK * SHM_MIN_CHUNK
+        if self.data_start + (SHM_MIN_CHUNK << (SHM_CLASSES - 1)) > size:
+            raise ValueError("共享内存缓存空间过小")
+
+        self._fd = None
+        self._mm = None
+        self._pid = None
+        self._open()
+
+    def _open(self):
+        """
+        打开文件并映射，每个进程单独打开
+        fork出的子进程与父进程共享同一个打开的文件描述，flock无法在它们之间互斥，所以子进程必须重新打开
+        """
+        if self._mm is not None:
+            self._mm.close()
+            os.close(self._fd)
+        self._depth = 0
+        self._pid = os.getpid()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != self.size:
+                os.ftruncate(self._fd, self.size)
+            self._mm = mmap.mmap(self._fd, self.size)
+            if SHM_HEADER.unpack_from(self._mm, 0) != (SHM_MAGIC, SHM_VERSION, self.nbuckets, self.size):
+                self._set_u64(SHM_OFF_SEQ, 0)
+                self._reset()
+        finally:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+    def _ensure_open(self):
+        # uWSGI等预先fork的场景下，文件在主进程中打开，各工作进程需要重新打开
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._open()
+
+    def _u64(self, offset):
+        return SHM_U64.unpack_from(self._mm, offset)[0]
+
+    def _set_u64(self, offset, value):
+        SHM_U64.pack_into(self._mm, offset, value)
+
+    def _reset(self):
+        # 保留写入序号，clear()在持有写锁时调用，序号清零后解锁会变为奇数，之后的读取都会走加锁的路径
+        self._mm[SHM_OFF_BUMP:self.data_start] = bytes(self.data_start - SHM_OFF_BUMP)
+        self._set_u64(SHM_OFF_BUMP, self.data_start)
+        SHM_HEADER.pack_into(self._mm, 0, SHM_MAGIC, SHM_VERSION, self.nbuckets, self.size)
+
+    @contextmanager
+    def locked(self):
+        """写锁，同一进程内可重入"""
+        self._ensure_open()
+        with self._lock:
+            if self._depth == 0:
+                self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+                seq = self._u64(SHM_OFF_SEQ)
+                self._set_u64(SHM_OFF_SEQ, seq + 1 if seq % 2 == 0 else seq + 2)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._set_u64(SHM_OFF_SEQ, self._u64(SHM_OFF_SEQ) + 1)
+                    self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+    def _bucket(self, key):
+        return SHM_OFF_BUCKETS + zlib.crc32(key) % self.nbuckets * 8
+
+    def _find(self, key):
+        offset = self._u64(self._bucket(key))
+        for _ in range(self.nbuckets):
+            if not offset:
+                return None
+            if not self.data_start <= offset < self.size:
+                raise ValueError("invalid item offset")
+            next_offset, expires, key_len, value_len, _, _ = SHM_ITEM.unpack_from(self._mm, offset)
+            start = offset + SHM_ITEM.size
+            if self._mm[start:start + key_len] == key:
+                return expires, self._mm[start + key_len:start + key_len + value_len]
+            offset = next_offset
+        raise ValueError("item chain too long")
+
+    def get(self, key, now=None):
+        """返回(expires, value)，读取时不加锁，被并发写入打断时重读，多次失败后加锁读取"""
+        self._ensure_open()
+        now = now or time()
+        for _ in range(8):
+            seq = self._u64(SHM_OFF_SEQ)
+            if seq % 2:
+                sleep(0)
+                continue
+            try:
+                item = self._find(key)
+            except (ValueError, struct.error):
+                continue
+            if self._u64(SHM_OFF_SEQ) == seq:
+                break
+        else:
+            with self.locked():
+                item = self._find(key)
+        return self._alive(item, now)
+
+    def lookup(self, key, now=None):
+        """已持有写锁时读取"""
+        return self._alive(self._find(key), now or time())
+
+    @staticmethod
+    def _alive(item, now):
+        if item is None or (item[0] and item[0] <= now):
+            return None
+        return item
+
+    def set(self, key, item):
+        expires, value = item
+        total = SHM_ITEM.size + len(key) + len(value)
+        slab_class = max((total - 1).bit_length() - (SHM_MIN_CHUNK - 1).bit_length(), 0)
+        if slab_class >= SHM_CLASSES:
+            return False
+        with self.locked():
+            self._remove(key)
+            offset = self._alloc(slab_class)
+            if not offset:
+                return False
+            bucket = self._bucket(key)
+            start = offset + SHM_ITEM.size
+            SHM_ITEM.pack_into(self._mm, offset, self._u64(bucket), expires, len(key), len(value), slab_class, 0)
+            self._mm[start:start + len(key)] = key
+            self._mm[start + len(key):start + len(key) + len(value)] = value
+            self._set_u64(bucket, offset)
+        return True
+
+    def pop(self, key):
+        with self.locked():
+            return self._remove(key)
+
+    def clear(self):
+        with self.locked():
+            self._reset()
+
+    def keys(self, now=None):
+        now = now or time()
+        result = []
+        with self.locked():
+            for bucket in range(SHM_OFF_BUCKETS, SHM_OFF_BUCKETS + self.nbuckets * 8, 8):
+                offset = self._u64(bucket)
+                while offset:
+                    next_offset, expires, key_len, _, _, _ = SHM_ITEM.unpack_from(self._mm, offset)
+                    if not expires or expires > now:
+                        result.append(self._mm[offset + SHM_ITEM.size:offset + SHM_ITEM.size + key_len])
+                    offset = next_offset
+        return result
+
+    def used_bytes(self):
+        """数据区已分配的字节数，包括空闲链表中的块"""
+        self._ensure_open()
+        return self._u64(SHM_OFF_BUMP) - self.data_start
+
+    def _remove(self, key):
+        prev = self._bucket(key)
+        offset = self._u64(prev)
+        while offset:
+            next_offset, _, key_len, _, slab_class, _ = SHM_ITEM.unpack_from(self._mm, offset)
+            start = offset + SHM_ITEM.size
+            if self._mm[start:start + key_len] == key:
+                self._set_u64(prev, next_offset)
+                self._free(offset, slab_class)
+                return True
+            prev, offset = offset, next_offset
+        return False
+
+    def _unlink_item(self, offset):
+        """把已用块从所在的桶链表中摘除，不放入空闲链表"""
+        key_len = SHM_ITEM.unpack_from(self._mm, offset)[2]
+        prev = self._bucket(self._mm[offset + SHM_ITEM.size:offset + SHM_ITEM.size + key_len])
+        current = self._u64(prev)
+        while current:
+            next_offset = self._u64(current)
+            if current == offset:
+                self._set_u64(prev, next_offset)
+                return
+            prev, current = current, next_offset
+
+    def _free(self, offset, slab_class):
+        # 空闲链表为双向链表，回收区域时可以摘除其中任意一块
+        head = SHM_OFF_FREE + slab_class * 8
+        first = self._u64(head)
+        SHM_FREE_ITEM.pack_into(self._mm, offset, first, 0, slab_class, 1)
+        if first:
+            self._set_u64(first + 8, offset)
+        self._set_u64(head, offset)
+
+    def _unlink_free(self, offset, slab_class):
+        next_offset, prev, _, _ = SHM_FREE_ITEM.unpack_from(self._mm, offset)
+        if prev:
+            self._set_u64(prev, next_offset)
+        else:
+            self._set_u64(SHM_OFF_FREE + slab_class * 8, next_offset)
+        if next_offset:
+            self._set_u64(next_offset + 8, prev)
+
+    def _split(self, offset, slab_class, target_class):
+        """把slab_class级的块拆分为target_class级，返回第一块，其余放入各级空闲链表"""
+        while slab_class > target_class:
+            slab_class -= 1
+            self._free(offset + (SHM_MIN_CHUNK << slab_class), slab_class)
+        return offset
+
+    def _alloc(self, slab_class):
+        # 依次尝试本级空闲块、拆分更大的空闲块、未分配空间，最后淘汰
+        for free_class in range(slab_class, SHM_CLASSES):
+            offset = self._u64(SHM_OFF_FREE + free_class * 8)
+            if offset:
+                self._unlink_free(offset, free_class)
+                return self._split(offset, free_class, slab_class)
+        chunk = SHM_MIN_CHUNK << slab_class
+        bump = self._u64(SHM_OFF_BUMP)
+        offset = self.data_start + (bump - self.data_start + chunk - 1) // chunk * chunk
+        if offset + chunk <= self.size:
+            self._free_range(bump, offset)
+            self._set_u64(SHM_OFF_BUMP, offset + chunk)
+            return offset
+        return self._evict(slab_class)
+
+    def _free_range(self, start, end):
+        """把对齐产生的空隙按对齐的块放入空闲链表"""
+        while start < end:
+            slab_class = 0
+            while (slab_class + 1 < SHM_CLASSES and (start - self.data_start) % (SHM_MIN_CHUNK << (slab_class + 1)) == 0
+                   and start + (SHM_MIN_CHUNK << (slab_class + 1)) <= end):
+                slab_class += 1
+            self._free(start, slab_class)
+            start += SHM_MIN_CHUNK << slab_class
+
+    def _evict(self, slab_class):
+        # 从上次的位置继续逐个扫描桶，释放已过期的项和同级别的项，直到有可用的块
+        now = time()
+        hand = self._u64(SHM_OFF_HAND)
+        for _ in range(min(self.nbuckets, SHM_EVICT_SCAN)):
+            hand = (hand + 1) % self.nbuckets
+            prev = SHM_OFF_BUCKETS + hand * 8
+            offset = self._u64(prev)
+            while offset:
+                next_offset, expires, _, _, item_class, _ = SHM_ITEM.unpack_from(self._mm, offset)
+                if item_class == slab_class or (expires and expires <= now):
+                    self._set_u64(prev, next_offset)
+                    self._free(offset, item_class)
+                else:
+                    prev = offset
+                offset = next_offset
+            if any(self._u64(SHM_OFF_FREE + free_class * 8) for free_class in range(slab_class, SHM_CLASSES)):
+                self._set_u64(SHM_OFF_HAND, hand)
+                return self._alloc(slab_class)
+        self._set_u64(SHM_OFF_HAND, hand)
+        return self._reclaim(slab_class)
+
+    def _chunk_at(self, position):
+        """
+        返回包含数据区中某个位置的块的偏移和级别
+        从最大级别对齐的位置开始逐级二分，对齐区域的中点不会被更小的块跨过，所以每次二分的起点都是块的起始位置
+        """
+        size = SHM_MIN_CHUNK << (SHM_CLASSES - 1)
+        offset = self.data_start + (position - self.data_start) // size * size
+        while True:
+            item_class = SHM_CHUNK_TAG.unpack_from(self._mm, offset + 22)[0]
+            if SHM_MIN_CHUNK << item_class >= size:
+                return offset, item_class
+            size //= 2
+            if position >= offset + size:
+                offset += size
+
+    def _release_chunk(self, offset):
+        """释放已用块或摘除空闲块，返回块的级别"""
+        item_class, is_free = SHM_CHUNK_TAG.unpack_from(self._mm, offset + 22)
+        if is_free:
+            self._unlink_free(offset, item_class)
+        else:
+            self._unlink_item(offset)
+        return item_class
+
+    def _reclaim(self, slab_class):
+        """
+        该级别没有可淘汰的项时，按数据区顺序轮流选取一个对齐的区域，释放其中所有的块后作为一块使用，
+        避免数据区分配完后没有存活项的级别再也无法分配
+        """
+        chunk = SHM_MIN_CHUNK << slab_class
+        bump = self._u64(SHM_OFF_BUMP)
+        position = self._u64(SHM_OFF_RECLAIM)
+        if not self.data_start <= position < bump:
+            position = self.data_start
+        start = self.data_start + (position - self.data_start) // chunk * chunk
+        if start + chunk > self.size:   # 末尾不足一个区域，从数据区开头重新选取
+            start = self.data_start
+
+        offset, item_class = self._chunk_at(start)
+        if item_class >= slab_class:
+            # 区域在一个不小于所需大小的块内，释放后拆分
+            self._release_chunk(offset)
+            self._set_u64(SHM_OFF_RECLAIM, offset + (SHM_MIN_CHUNK << item_class))
+            return self._split(offset, item_class, slab_class)
+
+        offset, end = start, min(start + chunk, bump)
+        while offset < end:
+            offset += SHM_MIN_CHUNK << self._release_chunk(offset)
+        if start + chunk > bump:
+            self._set_u64(SHM_OFF_BUMP, start + chunk)
+        self._set_u64(SHM_OFF_RECLAIM, start + chunk)
+        return start
+
+
+class ShmCache(NamespaceMixin, MemoizeMixin, StatsMixin):
+    """共享内存缓存，同一主机上的多个工作进程共享一份缓存数据"""
+    def __init__(self, app=None, key_prefix="", key_timeout=None, shm_path="", shm_size=None, shm_buckets=None):
+        self._store = None
+        self.codec = Codec()
+        self.key_prefix = key_prefix+"_" if key_prefix else ""
+        self.key_timeout = key_timeout if key_timeout else 0
+        self.app = app
+        if app is not None:
+            self.init_app(app, key_prefix, key_timeout, shm_path, shm_size, shm_buckets)
+
+    def init_app(self, app, key_prefix="", key_timeout=None, shm_path="", shm_size=None, shm_buckets=None):
+        self.key_prefix = f"{app.name}_{key_prefix+"_" if key_prefix else self.key_prefix}"
+        self.key_timeout = key_timeout if key_timeout else self.key_timeout
+        self.codec.init_app(app)
+
+        shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        shm_path = shm_path if shm_path else app.config.get("CACHE_SHM_PATH") or os.path.join(shm_dir, f"{app.name}_cache.shm")
+        shm_size = shm_size if shm_size else app.config.get("CACHE_SHM_SIZE", 64 * 1024 * 1024)
+        shm_buckets = shm_buckets if shm_buckets else app.config.get("CACHE_SHM_BUCKETS", 65536)
+        self._store = ShmStore(shm_path, shm_size, shm_buckets)
+
+    def _normalize_timeout(self, timeout):
+        if timeout is None:
+            timeout = self.key_timeout
+        if timeout <= 0:
+            return 0
+        return time() + timeout
+
+    def _key(self, key, key_prefix=True):
+        if self.key_prefix and key_prefix:
+            key = self.key_prefix + key
+        return key.encode()
+
+    def get(self, key, key_prefix=True):
+        item = self._store.get(self._key(key, key_prefix))
+        if item is None:
+            return None
+        return self.codec.loads(item[1])
+
+    def get_many(self, *keys, key_prefix=True):
+        return [self.get(key, key_prefix) for key in keys]
+
+    def set(self, key, value, key_prefix=True, timeout=None, codec=None):
+        return self._store.set(self._key(key, key_prefix), (self._normalize_timeout(timeout), self.codec.dumps(value, codec)))
+
+    def add(self, key, value, key_prefix=True, timeout=None, codec=None):
+        key = self._key(key, key_prefix)
+        with self._store.locked():
+            if self._store.lookup(key) is not None:
+                return False
+            return self._store.set(key, (self._normalize_timeout(timeout), self.codec.dumps(value, codec)))
+
+    def delete(self, key, key_prefix=True):
+        return self._store.pop(self._key(key, key_prefix))
+
+    def delete_many(self, *keys, key_prefix=True):
+        return sum(self.delete(key, key_prefix) for key in keys)
+
+    def has(self, key, key_prefix=True):
+        return self._store.get(self._key(key, key_prefix)) is not None
+
+    def get_and_touch(self, key, timeout, refresh_ratio=1, key_prefix=True):
+        """读取缓存，剩余有效时间低于timeout*refresh_ratio时把有效时间重置为timeout"""
+        key = self._key(key, key_prefix)
+        now = time()
+        item = self._store.get(key, now)
+        if item is None:
+            return None
+        expires, value = item
+        if expires and expires - now < timeout * refresh_ratio:
+            with self._store.locked():
+                item = self._store.lookup(key, now)
+                if item is not None:
+                    self._store.set(key, (self._normalize_timeout(timeout), item[1]))
+        return self.codec.loads(value)
+
+    def clear(self, key_prefix=True):
+        if self.key_prefix and key_prefix:
+            self.delete_pattern("*")
+        else:
+            self._store.clear()
+        return True
+
+    def iter_keys(self, pattern="*", key_prefix=True):
+        pattern = self._key(pattern, key_prefix).decode()
+        for key in self._store.keys():
+            key = key.decode()
+            if fnmatchcase(key, pattern):
+                yield key
+
+    def delete_pattern(self, pattern="*", key_prefix=True):
+        keys = list(self.iter_keys(pattern, key_prefix))
+        for key in keys:
+            self._store.pop(key.encode())
+        return len(keys)
+
+    def inc(self, key, delta=1, key_prefix=True):
+        key = self._key(key, key_prefix)
+        with self._store.locked():
+            expires, value = self._store.lookup(key) or (0, None)
+            value = int(self.codec.loads(value) or 0) + delta
+            self._store.set(key, (expires, self.codec.dumps(value, "json")))
+        return value
+
+    def dec(self, key, delta=1, key_prefix=True):
+        return self.inc(key, -delta, key_prefix)
+
+    def _entry_stats(self):
+        return len(self._store.keys()), self._store.used_bytes()
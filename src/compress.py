@@ -0,0 +1,80 @@
+# coding: utf-8
+"""
+响应压缩
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+根据Accept-Encoding选择br或gzip压缩响应内容，只压缩超过指定大小且在类型列表中的响应，
+带强ETag的响应内容不变，压缩结果按ETag缓存，如接口文档页面
+"""
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+DEFAULT_MIMETYPES = ("application/json", "text/html", "text/plain", "text/css", "text/javascript", "application/javascript")
+
+
+class Compress(object):
+    def __init__(self, app=None):
+        self.algorithms = ("br", "gzip")
+        self.min_size = 500
+        self.mimetypes = frozenset(DEFAULT_MIMETYPES)
+        self.level = 6
+        self.br_level = 4
+        self.cache_size = 64
+        self.cache = dict()     # (ETag, 压缩算法) -> 压缩后的内容
+
+        self.app = app
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get("COMPRESS"):
+            return
+        algorithms = app.config.get("COMPRESS_ALGORITHMS", self.algorithms)
+        self.algorithms = tuple(a for a in algorithms if a == "gzip" or a == "br" and brotli is not None)    # brotli未安装时只用gzip
+        self.min_size = app.config.get("COMPRESS_MIN_SIZE", self.min_size)
+        self.mimetypes = frozenset(app.config.get("COMPRESS_MIMETYPES", self.mimetypes))
+        self.level = app.config.get("COMPRESS_LEVEL", self.level)
+        self.br_level = app.config.get("COMPRESS_BR_LEVEL", self.br_level)
+        self.cache_size = app.config.get("COMPRESS_CACHE_SIZE", self.cache_size)
+        if self.algorithms:
+            app.after_request(self._after_request)
+
+    def compress(self, data, encoding):
+        if encoding == "br":
+            return brotli.compress(data, quality=self.br_level)
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def _after_request(self, response):
+        if response.mimetype not in self.mimetypes:
+            return response
+        response.vary.add("Accept-Encoding")
+        if (response.direct_passthrough or response.is_streamed or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or "Content-Encoding" in response.headers or "no-transform" in response.headers.get("Cache-Control", "")):
+            return response
+        length = response.calculate_content_length()
+        if length is None or length < self.min_size:
+            return response
+        encoding = request.accept_encodings.best_match(self.algorithms)
+        if encoding is None:
+            return response
+
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            key = (etag, encoding)
+            data = self.cache.get(key)
+            if data is None:
+                data = self.compress(response.get_data(), encoding)
+                if len(self.cache) < self.cache_size:
+                    self.cache[key] = data
+            response.set_etag(etag, weak=True)     # 压缩后的内容与原内容不再逐字节相同
+        else:
+            data = self.compress(response.get_data(), encoding)
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        return response
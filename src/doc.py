@@ -5,9 +5,25 @@
 利用注释生成接口文档
 """
 import re
+import hashlib
 from functools import partial
 
-from flask import url_for, render_template_string
+from flask import Response, request, url_for, render_template_string
+
+
+# 接口注释的解析规则，参数校验也使用同样的规则解析#param
+RE_DOC_IGNORE = re.compile(r"\s*#ignore_doc\s*")
+RE_DOC_GROUP = re.compile(r"\s*#group\s*(.*)\s*")  # 接口归属分组
+RE_DOC_NAME = re.compile(r"\s*#name\s*(.*)\s*")  # 接口名称
+RE_DOC_DESC = re.compile(r"\s*#desc\s*(.*)\s*")  # 接口描述
+RE_DOC_PRIV = re.compile(r"\s*#priv\s*(.*)\s*")  # 接口权限
+RE_DOC_PARAMS = re.compile(r"\s*#param\s*(.*)\s*")  # 接口参数
+RE_DOC_RETURNS = re.compile(r"\s*#return\s*(.*)\s*")  # 接口返回值
+RE_DOC_INPUT_EXAMPLE = re.compile(r"(?<=#input_example)\s*(.*)?\s*(?=#output_example)", re.S | re.M)  # 接口输入示例
+RE_DOC_OUTPUT_EXAMPLE = re.compile(r"(?<=#output_example)\s*(.*)?\s*$", re.S | re.M)  # 接口返回示例（一直取到最后）
+RE_DOC_PARAM_FIELD = re.compile(r"^([a-zA-Z0-9_\\.\-\[\]]+)\s*(?:<([^<>]*)>)?\s*(?:<([^<>]*)>)?\s*(.*)$")  # 参数字段内容分隔
+RE_DOC_RETURN_FIELD = re.compile(r"^([a-zA-Z0-9_\\.\-\[\]]+)\s*(?:<([^<>]*)>)?\s*(.*)$")  # 返回值字段内容分隔
+RE_DOC_SUB_FIELD = re.compile(r"([a-zA-Z0-9_\[\]]+\.)")  # 多级字段匹配
 
 
 PAGE_HTML = """
@@ -273,13 +289,15 @@ class ApiDoc(object):
         self.api_doc_endpoint = "api_doc"
         self.api_doc_url = api_doc_url
         self.html = PAGE_HTML
+        self.page = None
+        self.page_etag = None
         self.app = app
         if app is not None:
             self.init_app(app, blueprint_names)
 
     def init_app(self, app, blueprint_names):
         api_data = self.collect_api(blueprint_names)
-        api_doc_func = partial(self.generate_doc, api_data=api_data)
+        api_doc_func = partial(self.doc_page, api_data=api_data)
         api_doc_endpoint = app.name + "_" + self.api_doc_endpoint
         app.add_url_rule(self.api_doc_url, view_func=api_doc_func, endpoint=api_doc_endpoint, methods=["GET"])
 
@@ -299,23 +317,19 @@ class ApiDoc(object):
             }
         return api_data
 
+    def doc_page(self, api_data=None):
+        """返回接口文档页面，启动后接口不再变化，第一次访问时生成并缓存，带ETag供客户端和压缩缓存复用"""
+        if self.page is None:
+            self.page = self.generate_doc(api_data).encode()
+            self.page_etag = hashlib.md5(self.page).hexdigest()
+        response = Response(self.page, mimetype="text/html")
+        response.set_etag(self.page_etag)
+        return response.make_conditional(request)
+
     def generate_doc(self, api_data=None):
         """生成接口文档"""
         api_data = api_data if api_data is not None else dict()
 
-        re_ignore = re.compile(r"\s*#ignore_doc\s*")
-        re_group = re.compile(r"\s*#group\s*(.*)\s*")  # 接口归属分组
-        re_name = re.compile(r"\s*#name\s*(.*)\s*")  # 接口名称
-        re_desc = re.compile(r"\s*#desc\s*(.*)\s*")  # 接口描述
-        re_priv = re.compile(r"\s*#priv\s*(.*)\s*")  # 接口权限
-        re_params = re.compile(r"\s*#param\s*(.*)\s*")  # 接口参数
-        re_rets = re.compile(r"\s*#return\s*(.*)\s*")  # 接口返回值
-        re_input_example = re.compile(r"(?<=#input_example)\s*(.*)?\s*(?=#output_example)", re.S | re.M)  # 接口输入示例
-        re_output_example = re.compile(r"(?<=#output_example)\s*(.*)?\s*$", re.S | re.M)  # 接口返回示例（一直取到最后）
-        re_params_field = re.compile(r"^([a-zA-Z0-9_\\.\-\[\]]+)\s*(?:<([^<>]*)>)?\s*(?:<([^<>]*)>)?\s*(.*)$")  # 参数字段内容分隔
-        re_return_field = re.compile(r"^([a-zA-Z0-9_\\.\-\[\]]+)\s*(?:<([^<>]*)>)?\s*(.*)$")  # 返回值字段内容分隔
-        em = re.compile(r"([a-zA-Z0-9_\[\]]+\.)")  # 多级字段匹配
-
         api_count = 0
         for data in api_data.values():
             api_doc_data = {}
@@ -324,32 +338,32 @@ class ApiDoc(object):
                     continue
 
                 doc = func.__doc__ or ""
-                if re_ignore.findall(doc):
+                if RE_DOC_IGNORE.findall(doc):
                     continue
 
-                name = re_name.findall(doc) or [endpoint]
-                desc = re_desc.findall(doc) or [""]
-                priv = re_priv.findall(doc) or ["-"]
-                group = re_group.findall(doc) or ["未分类"]
-                params = re_params.findall(doc) or []
-                rets = re_rets.findall(doc) or []
-                input_example = re_input_example.findall(doc) or [""]
-                output_example = re_output_example.findall(doc) or [""]
+                name = RE_DOC_NAME.findall(doc) or [endpoint]
+                desc = RE_DOC_DESC.findall(doc) or [""]
+                priv = RE_DOC_PRIV.findall(doc) or ["-"]
+                group = RE_DOC_GROUP.findall(doc) or ["未分类"]
+                params = RE_DOC_PARAMS.findall(doc) or []
+                rets = RE_DOC_RETURNS.findall(doc) or []
+                input_example = RE_DOC_INPUT_EXAMPLE.findall(doc) or [""]
+                output_example = RE_DOC_OUTPUT_EXAMPLE.findall(doc) or [""]
 
                 params_data = []
                 for p in params:
-                    p_match = re_params_field.match(p)
+                    p_match = RE_DOC_PARAM_FIELD.match(p)
                     if p_match:
                         p_name, p_type, p_option, p_desc = p_match.group(1, 2, 3, 4)
-                        p_name = em.sub(r"<small><em>\1</em></small>", p_name)
+                        p_name = RE_DOC_SUB_FIELD.sub(r"<small><em>\1</em></small>", p_name)
                         params_data.append({"name": p_name, "type": p_type, "option": p_option if p_option else "必需", "desc": p_desc})
 
                 return_data = []
                 for r in rets:
-                    r_match = re_return_field.match(r)
+                    r_match = RE_DOC_RETURN_FIELD.match(r)
                     if r_match:
                         r_name, r_type, r_desc = r_match.group(1, 2, 3)
-                        r_name = em.sub(r"<small><em>\1</em></small>", r_name)
+                        r_name = RE_DOC_SUB_FIELD.sub(r"<small><em>\1</em></small>", r_name)
                         return_data.append({"name": r_name, "type": r_type, "desc": r_desc})
 
                 api_info = {
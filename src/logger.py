@@ -15,6 +15,7 @@ class Logger(object):
         self.log_dir = "logs"
         self.log_level = 20     # CRITICAL:50,ERROR:40,WARNING:30,INFO:20,DEBUG:10,NOTSET:0
         self.log_keep_day = 30
+        self.log_path = ""
 
         self.app = app
         if app is not None:
@@ -37,6 +38,7 @@ class Logger(object):
                 os.makedirs(log_path)
             except Exception as e:
                 raise e
+        self.log_path = log_path
 
         formatter = Formatter('%(asctime)s|%(levelname)s|%(pathname)s(%(lineno)d)|%(funcName)s|%(message)s')
         log_file = os.path.join(log_path, app.name + '.log')
@@ -0,0 +1,298 @@
+# coding: utf-8
+"""
+监控指标
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+按接口统计请求耗时分布、状态码、api返回码、请求和响应大小以及处理中的请求数，
+每个工作进程只在本进程内累加，定期写入spool目录，查看时汇总所有进程的数据，按Prometheus文本格式输出
+"""
+import os
+import json
+import tempfile
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import time
+
+from flask import Response, current_app, g, request
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# 请求耗时分布的默认区间，秒
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 已退出进程的累计数据合并后保存的文件，spool目录中的文件数量不随工作进程重启而增长
+RETIRED_FILE = "retired.json"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _dump(path, data):
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(f"{path}.tmp", path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:     # 进程存在但属于其他用户
+        return True
+    return True
+
+
+def _merge(snapshots, buckets):
+    """合并多个进程的数据，区间配置不同的旧数据无法合并，直接忽略"""
+    requests, codes, latency, sizes, in_flight = dict(), dict(), dict(), dict(), 0
+    for data in snapshots:
+        if tuple(data["buckets"]) != buckets:
+            continue
+        for *key, count in data["requests"]:
+            key = tuple(key)
+            requests[key] = requests.get(key, 0) + count
+        for *key, count in data["codes"]:
+            key = tuple(key)
+            codes[key] = codes.get(key, 0) + count
+        for endpoint, hist in data["latency"].items():
+            total = latency.setdefault(endpoint, [0] * len(hist))
+            for i, value in enumerate(hist):
+                total[i] += value
+        for endpoint, size in data["sizes"].items():
+            total = sizes.setdefault(endpoint, [0, 0])
+            total[0] += size[0]
+            total[1] += size[1]
+        in_flight += data["in_flight"]
+    return requests, codes, latency, sizes, in_flight
+
+
+class Metrics(object):
+    def __init__(self, app=None, spool_dir=None):
+        self.buckets = DEFAULT_BUCKETS
+        self.spool_dir = ""
+        self.flush_interval = 5
+        self._next_flush = 0
+        self._reset()
+
+        self.app = app
+        if app is not None:
+            self.init_app(app, spool_dir)
+
+    def _reset(self):
+        # 只在本进程内累加，gevent下各协程交替执行，不需要加锁
+        self.requests = dict()      # (endpoint, method, status) -> 次数
+        self.codes = dict()         # (endpoint, api返回码) -> 次数
+        self.latency = dict()       # endpoint -> [各区间次数..., 超过所有区间的次数, 总耗时, 总次数]
+        self.sizes = dict()         # endpoint -> [请求字节数, 响应字节数]
+        self.in_flight = 0
+        self._pid = os.getpid()
+        self._started = time()      # 区分pid被复用时的前后两个进程
+        self._flushed = False
+
+    def init_app(self, app, spool_dir=None):
+        if not app.config.get("METRICS"):
+            return
+        self.buckets = tuple(app.config.get("METRICS_BUCKETS", self.buckets))
+        self.flush_interval = app.config.get("METRICS_FLUSH_INTERVAL", self.flush_interval)
+        self.spool_dir = spool_dir if spool_dir else app.config.get("METRICS_SPOOL_DIR") or os.path.join(tempfile.gettempdir(), f"{app.name}_metrics")
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        metrics_url = app.config.get("METRICS_URL")
+        if metrics_url:
+            app.add_url_rule(metrics_url, endpoint=f"{app.name}_metrics", view_func=self.view)
+
+    def _before_request(self):
+        if self._pid != os.getpid():    # 预加载后fork出的工作进程不继承主进程的数据
+            self._reset()
+        self.in_flight += 1
+        g.metrics_counted = True
+
+    def _after_request(self, response):
+        self.record(request.endpoint, request.method, response.status_code, g.get("api_code"),
+                    request.content_length or 0, response.calculate_content_length() or 0)
+        g.metrics_recorded = True
+        return response
+
+    def _teardown_request(self, error=None):
+        if g.pop("metrics_counted", False):
+            self.in_flight -= 1
+        if not g.pop("metrics_recorded", False):    # 出现未处理的异常时after_request不会执行
+            self.record(request.endpoint, request.method, 500, None, request.content_length or 0, 0)
+        now = time()
+        if now >= self._next_flush:
+            self._next_flush = now + self.flush_interval
+            self.flush()
+
+    def record(self, endpoint, method, status, api_code, request_bytes, response_bytes):
+        endpoint = endpoint or "not_found"
+        elapsed = time() - g.get("request_stime", time())
+
+        key = (endpoint, method, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        if api_code is not None:
+            key = (endpoint, api_code)
+            self.codes[key] = self.codes.get(key, 0) + 1
+
+        hist = self.latency.get(endpoint)
+        if hist is None:
+            hist = self.latency[endpoint] = [0] * (len(self.buckets) + 3)
+        hist[bisect_left(self.buckets, elapsed)] += 1   # 最后一个区间之后的位置表示超过所有区间
+        hist[-2] += elapsed
+        hist[-1] += 1
+
+        size = self.sizes.get(endpoint)
+        if size is None:
+            size = self.sizes[endpoint] = [0, 0]
+        size[0] += request_bytes
+        size[1] += response_bytes
+
+    def snapshot(self):
+        return {
+            "pid": os.getpid(),
+            "started": self._started,
+            "buckets": self.buckets,
+            "requests": [[*key, count] for key, count in self.requests.items()],
+            "codes": [[*key, count] for key, count in self.codes.items()],
+            "latency": self.latency,
+            "sizes": self.sizes,
+            "in_flight": self.in_flight,
+        }
+
+    @contextmanager
+    def _spool_lock(self, exclusive=False):
+        """合并已退出进程的数据时加排他锁，读取时加共享锁，避免同一份数据被重复统计"""
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(os.path.join(self.spool_dir, ".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)
+
+    def _is_retired(self, data):
+        """数据所属的进程已退出，或者pid已被当前进程复用"""
+        if data["pid"] == self._pid:
+            return data.get("started") != self._started
+        return not _pid_alive(data["pid"])
+
+    def flush(self):
+        """把本进程的累计数据写入spool目录，先写临时文件再替换"""
+        if not self.spool_dir:
+            return
+        path = os.path.join(self.spool_dir, f"{os.getpid()}.json")
+        try:
+            if not self._flushed:   # 第一次写入前先合并使用过同一pid的已退出进程的数据
+                self._flushed = True
+                self.retire([path])
+            _dump(path, self.snapshot())
+        except OSError as e:
+            current_app.logger.error(f"监控数据写入失败：{path}, {e}")
+
+    def retire(self, paths):
+        """把已退出进程的数据合并到RETIRED_FILE并删除原文件"""
+        with self._spool_lock(exclusive=True):
+            retired_path = os.path.join(self.spool_dir, RETIRED_FILE)
+            retired = _load(retired_path)
+            snapshots = [retired] if retired else []
+            removed = []
+            for path in paths:
+                data = _load(path)
+                if data is None or not self._is_retired(data):
+                    continue
+                snapshots.append(data)
+                removed.append(path)
+            if not removed:
+                return
+            requests, codes, latency, sizes, _ = _merge(snapshots, self.buckets)
+            _dump(retired_path, {
+                "pid": 0,
+                "buckets": self.buckets,
+                "requests": [[*key, count] for key, count in requests.items()],
+                "codes": [[*key, count] for key, count in codes.items()],
+                "latency": latency,
+                "sizes": sizes,
+                "in_flight": 0,
+            })
+            for path in removed:
+                os.remove(path)
+
+    def collect(self):
+        """汇总所有工作进程的数据，已退出进程的数据合并到RETIRED_FILE，保留累计值，不计入处理中的请求数"""
+        snapshots = [self.snapshot()]
+        retired = []
+        with self._spool_lock():
+            for name in os.listdir(self.spool_dir) if self.spool_dir else []:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.spool_dir, name)
+                data = _load(path)
+                if data is None:
+                    continue
+                if name != RETIRED_FILE:
+                    if data["pid"] == self._pid and data.get("started") == self._started:
+                        continue    # 当前进程使用内存中的数据
+                    if not self._is_retired(data):
+                        snapshots.append(data)
+                        continue
+                    retired.append(path)
+                data["in_flight"] = 0
+                snapshots.append(data)
+        if retired:
+            try:
+                self.retire(retired)
+            except OSError as e:
+                current_app.logger.error(f"监控数据合并失败：{e}")
+        return _merge(snapshots, self.buckets)
+
+    def render(self):
+        """按Prometheus文本格式输出"""
+        requests, codes, latency, sizes, in_flight = self.collect()
+        lines = ["# HELP http_requests_total 请求次数", "# TYPE http_requests_total counter"]
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(f"http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+        lines += ["# HELP api_return_code_total api返回码次数", "# TYPE api_return_code_total counter"]
+        for (endpoint, code), count in sorted(codes.items()):
+            lines.append(f"api_return_code_total{_labels(endpoint=endpoint, code=code)} {count}")
+
+        lines += ["# HELP http_request_duration_seconds 请求耗时", "# TYPE http_request_duration_seconds histogram"]
+        for endpoint, hist in sorted(latency.items()):
+            cumulative = 0
+            for le, count in zip(self.buckets, hist):
+                cumulative += count
+                lines.append(f"http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=le)} {cumulative}")
+            lines.append(f"http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le='+Inf')} {hist[-1]}")
+            lines.append(f"http_request_duration_seconds_sum{_labels(endpoint=endpoint)} {hist[-2]:.6f}")
+            lines.append(f"http_request_duration_seconds_count{_labels(endpoint=endpoint)} {hist[-1]}")
+
+        lines += ["# HELP http_request_size_bytes_total 请求内容字节数", "# TYPE http_request_size_bytes_total counter"]
+        lines += [f"http_request_size_bytes_total{_labels(endpoint=endpoint)} {size[0]}" for endpoint, size in sorted(sizes.items())]
+        lines += ["# HELP http_response_size_bytes_total 响应内容字节数", "# TYPE http_response_size_bytes_total counter"]
+        lines += [f"http_response_size_bytes_total{_labels(endpoint=endpoint)} {size[1]}" for endpoint, size in sorted(sizes.items())]
+
+        lines += ["# HELP http_requests_in_flight 处理中的请求数", "# TYPE http_requests_in_flight gauge", f"http_requests_in_flight {in_flight}"]
+        return "\n".join(lines) + "\n"
+
+    def view(self):
+        return Response(self.render(), mimetype="text/plain; version=0.0.4")
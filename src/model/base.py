@@ -4,12 +4,36 @@
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 """
+from datetime import date
+from functools import lru_cache
 from hmac import compare_digest
 
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from .. import db
-from ..tool import get_age
+from .. import db, cache
+from ..tool import get_age, run_in_threadpool
+
+
+# 用户资料缓存前缀
+USER_PROFILE_PREFIX = "user_profile_"
+# 用户资料缓存的字段，不包含密码，校验密码时会从数据库加载记录
+USER_PROFILE_FIELDS = ("id", "account", "nickname", "avatar_url", "gender", "birthday", "app_channel", "app_version",
+                       "os_type", "os_version", "remark", "status")
+
+
+@lru_cache(maxsize=8)
+def _hash_method(method):
+    """返回哈希方法在密码哈希值中的完整写法，如scrypt会补全为scrypt:32768:8:1"""
+    return generate_password_hash("", method).split("$", 1)[0]
+
+
+def hash_password(raw_pwd):
+    """按PASSWORD_HASH_METHOD生成密码哈希，在线程池中执行"""
+    method = current_app.config.get("PASSWORD_HASH_METHOD", "scrypt")
+    return run_in_threadpool(generate_password_hash, (raw_pwd, method), pool_size=current_app.config.get("PASSWORD_HASH_POOL_SIZE"))
 
 
 class AdminUser(db.Model):
@@ -41,17 +65,92 @@ class AdminUser(db.Model):
 
     @password.setter
     def password(self, raw_pwd):
-        self._password = generate_password_hash(raw_pwd)
+        self._password = hash_password(raw_pwd)
 
     def check_password(self, password, is_hash=False):
         if is_hash:
             return compare_digest(self.password, password)
-        return check_password_hash(self.password, password)
+        return run_in_threadpool(check_password_hash, (self.password, password), pool_size=current_app.config.get("PASSWORD_HASH_POOL_SIZE"))
+
+    def needs_rehash(self):
+        """密码哈希方法或强度与当前配置不一致时需要重新哈希"""
+        method = current_app.config.get("PASSWORD_HASH_METHOD", "scrypt")
+        return self.password.split("$", 1)[0] != _hash_method(method)
 
     @property
     def age(self):
         return get_age(self.birthday)
 
+    def to_profile(self):
+        """返回需要缓存的用户资料，生日保存为ISO格式字符串"""
+        profile = {field: getattr(self, field) for field in USER_PROFILE_FIELDS}
+        profile["birthday"] = self.birthday.isoformat() if self.birthday else None
+        return profile
+
+
+class LazyUser:
+    """
+    缓存的用户资料，读取缓存中的字段时不访问数据库
+    写入字段或访问其他属性时才从数据库加载对应的记录并加入session，之后的读写都交给该记录，修改可以正常提交
+    """
+    def __init__(self, profile):
+        if profile.get("birthday"):
+            profile["birthday"] = date.fromisoformat(profile["birthday"])
+        object.__setattr__(self, "_profile", profile)
+        object.__setattr__(self, "_user", None)
+
+    def _load(self):
+        if self._user is None:
+            object.__setattr__(self, "_user", db.session.get(AdminUser, self._profile["id"]))
+        return self._user
+
+    def __getattr__(self, name):
+        if self._user is None and name in self._profile:
+            return self._profile[name]
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    @property
+    def age(self):
+        return get_age(self.birthday)
+
+
+def load_user(user_id):
+    """
+    读取用户，缓存命中时返回LazyUser，否则查询数据库并缓存用户资料
+    :param user_id: 用户ID
+    :return: LazyUser 或 AdminUser，用户不存在时返回None
+    """
+    key = "{0}{1}".format(USER_PROFILE_PREFIX, user_id)
+    profile = cache.get(key)
+    if profile is not None:
+        return LazyUser(profile)
+    user = AdminUser.query.filter_by(id=user_id).first()
+    if user is not None:
+        cache.set(key, user.to_profile(), timeout=current_app.config.get("USER_PROFILE_CACHE_TIMEOUT", 10 * 60))
+    return user
+
+
+@event.listens_for(AdminUser, "after_update")
+@event.listens_for(AdminUser, "after_delete")
+def _mark_user_changed(mapper, connection, target):
+    # 记录本次事务中修改过的用户，提交后再清除缓存，避免回滚时缓存与数据库不一致
+    inspect(target).session.info.setdefault("changed_user_ids", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _clear_user_profile(session):
+    user_ids = session.info.pop("changed_user_ids", None)
+    if user_ids:
+        cache.delete_many(*["{0}{1}".format(USER_PROFILE_PREFIX, user_id) for user_id in user_ids])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop("changed_user_ids", None)
+
 
 class VerifySMS(db.Model):
     """短信验证码表"""
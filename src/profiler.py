@@ -0,0 +1,172 @@
+# coding: utf-8
+"""
+请求采样分析
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+按比例抽取指定接口的请求，或由带签名的请求头指定，请求处理期间用ITIMER_PROF定时采样调用栈，
+按接口汇总后以collapsed stack格式写入日志目录下的profile目录，可直接用flamegraph.pl、speedscope生成火焰图
+"""
+import os
+import sys
+import random
+import signal
+import threading
+from time import time
+
+from flask import current_app, g, request
+from itsdangerous import BadSignature, TimestampSigner
+
+
+def _current_ident():
+    """当前请求的标识，gevent未打补丁时同一线程中的协程共用线程标识，按协程区分"""
+    gevent = sys.modules.get("gevent")
+    if gevent is not None:
+        current = gevent.getcurrent()
+        if isinstance(current, gevent.Greenlet):
+            return current
+    return threading.get_ident()
+
+
+class Profiler(object):
+    def __init__(self, app=None, profile_dir=None):
+        self.profile_dir = ""
+        self.sample_rate = 0
+        self.endpoints = None
+        self.interval = 0.005
+        self.header = ""
+        self.token_max_age = 300
+        self.flush_interval = 60
+        self.signer = None
+        self._next_flush = 0
+        self._active = dict()       # 线程标识或协程 -> 接口名称
+        self._names = dict()        # 代码对象 -> 栈帧名称
+        self._running = False
+        self._reset()
+
+        self.app = app
+        if app is not None:
+            self.init_app(app, profile_dir)
+
+    def _reset(self):
+        self.stacks = dict()        # 接口名称 -> {调用栈: 采样次数}
+        self._pid = os.getpid()
+
+    def init_app(self, app, profile_dir=None):
+        self.sample_rate = app.config.get("PROFILE_SAMPLE_RATE", self.sample_rate) if app.config.get("PROFILE") else 0
+        self.header = app.config.get("PROFILE_HEADER", self.header)
+        if self.header and not app.config.get("SECRET_KEY"):
+            app.logger.warning("未设置SECRET_KEY，无法校验请求头PROFILE_HEADER，按请求头采样未启用")
+            self.header = ""
+        if not self.sample_rate and not self.header:
+            return
+        if not hasattr(signal, "setitimer"):
+            app.logger.warning("当前系统不支持ITIMER_PROF，请求采样分析未启用")
+            return
+        try:
+            signal.signal(signal.SIGPROF, self._sample)
+        except ValueError:      # 只能在主线程中注册信号处理函数
+            app.logger.warning("请求采样分析需要在主线程中创建应用，未启用")
+            return
+
+        endpoints = app.config.get("PROFILE_ENDPOINTS")
+        self.endpoints = frozenset(endpoints) if endpoints else None
+        self.interval = app.config.get("PROFILE_INTERVAL", self.interval)
+        self.token_max_age = app.config.get("PROFILE_TOKEN_MAX_AGE", self.token_max_age)
+        self.flush_interval = app.config.get("PROFILE_FLUSH_INTERVAL", self.flush_interval)
+        self.signer = TimestampSigner(app.config.get("SECRET_KEY") or "", salt="request-profile")
+        self.profile_dir = profile_dir if profile_dir else app.config.get("PROFILE_DIR") or os.path.join(app.root_path, "logs", "profile")
+        os.makedirs(self.profile_dir, exist_ok=True)
+
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def create_token(self):
+        """生成请求头PROFILE_HEADER的值，有效期PROFILE_TOKEN_MAX_AGE秒"""
+        return self.signer.sign("profile").decode()
+
+    def _is_selected(self):
+        if self.header:
+            token = request.headers.get(self.header)
+            if token:
+                try:
+                    self.signer.unsign(token, max_age=self.token_max_age)
+                    return True
+                except BadSignature:
+                    pass
+        if not self.sample_rate or self.endpoints is not None and request.endpoint not in self.endpoints:
+            return False
+        return random.random() < self.sample_rate
+
+    def _before_request(self):
+        if self._pid != os.getpid():    # 预加载后fork出的工作进程不继承主进程的数据
+            self._reset()
+        if not self._is_selected():
+            return
+        self._active[_current_ident()] = request.endpoint or "not_found"
+        g.profiled = True
+        if not self._running:
+            self._running = True
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def _teardown_request(self, error=None):
+        if not g.pop("profiled", False):
+            return
+        self._active.pop(_current_ident(), None)
+        if not self._active and self._running:     # 没有需要采样的请求时停止定时器，不影响其他请求
+            self._running = False
+            signal.setitimer(signal.ITIMER_PROF, 0)
+        now = time()
+        if now >= self._next_flush:
+            self._next_flush = now + self.flush_interval
+            self.flush()
+
+    def _sample(self, signum, frame):
+        """
+        SIGPROF处理函数，只在主线程中执行
+        gevent下处理函数运行在被中断的协程中，frame即该协程的调用栈，其他协程此时没有占用CPU，不需要采样；
+        多线程下从sys._current_frames中取各线程的调用栈
+        """
+        active = self._active
+        if not active:
+            return
+        ident = _current_ident()
+        endpoint = active.get(ident)
+        if endpoint is not None and frame is not None:
+            self._record(endpoint, frame)
+        if len(active) > (endpoint is not None):
+            frames = sys._current_frames()
+            for other, endpoint in list(active.items()):
+                if other != ident and isinstance(other, int) and other in frames:
+                    self._record(endpoint, frames[other])
+
+    def _frame_name(self, code):
+        name = self._names.get(code)
+        if name is None:
+            filename = code.co_filename
+            for path in sorted(sys.path, key=len, reverse=True):
+                if path and filename.startswith(path + os.sep):
+                    filename = filename[len(path) + 1:]
+                    break
+            name = self._names[code] = f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(";", ":")
+        return name
+
+    def _record(self, endpoint, frame):
+        names = []
+        while frame is not None:
+            names.append(self._frame_name(frame.f_code))
+            frame = frame.f_back
+        stack = ";".join(reversed(names))
+        stacks = self.stacks.get(endpoint)
+        if stacks is None:
+            stacks = self.stacks[endpoint] = dict()
+        stacks[stack] = stacks.get(stack, 0) + 1
+
+    def flush(self):
+        """把本进程各接口的累计采样写入profile目录，每个接口每个进程一个文件，先写临时文件再替换"""
+        for endpoint, stacks in list(self.stacks.items()):
+            path = os.path.join(self.profile_dir, f"{endpoint}.{os.getpid()}.folded")
+            try:
+                with open(f"{path}.tmp", "w") as f:
+                    f.writelines(f"{stack} {count}\n" for stack, count in list(stacks.items()))
+                os.replace(f"{path}.tmp", path)
+            except OSError as e:
+                current_app.logger.error(f"采样数据写入失败：{path}, {e}")
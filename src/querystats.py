@@ -0,0 +1,90 @@
+# coding: utf-8
+"""
+SQL统计
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+通过数据库引擎事件统计每个请求的SQL次数和耗时，记录慢查询及其调用位置，
+同一请求内相同语句重复执行达到阈值时给出N+1查询警告
+"""
+import os
+import re
+import sys
+from time import perf_counter
+
+from flask import g, has_request_context
+from sqlalchemy import event
+
+
+# 把展开后的IN参数列表合并为一个占位符，参数个数不同的同一语句视为相同语句
+RE_SQL_PARAM_LIST = re.compile(r"\(\s*(?:%s|\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:%s|\?|%\(\w+\)s|:\w+))+\s*\)")
+
+
+def _statement_shape(statement):
+    return RE_SQL_PARAM_LIST.sub("(?)", statement) if "," in statement else statement
+
+
+class QueryStats(object):
+    def __init__(self, app=None, db=None):
+        self.slow_time = 0.5
+        self.repeat_threshold = 5
+        self.max_param_length = 1000
+        self.root_path = ""
+
+        self.app = app
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        if not app.config.get("QUERY_STATS"):
+            return
+        self.app = app
+        self.slow_time = app.config.get("QUERY_SLOW_TIME", self.slow_time)
+        self.repeat_threshold = app.config.get("QUERY_REPEAT_THRESHOLD", self.repeat_threshold)
+        self.root_path = app.root_path.rstrip(os.sep) + os.sep
+
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+                event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        if app.config.get("QUERY_STATS_HEADERS"):
+            app.after_request(self._after_request)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - conn.info["query_start_time"].pop()
+        if elapsed >= self.slow_time:
+            params = repr(parameters)
+            if len(params) > self.max_param_length:
+                params = params[:self.max_param_length] + "..."
+            self.app.logger.warning(f"慢查询：{elapsed * 1000:.1f}ms, {self.call_site()}, {' '.join(statement.split())}, {params}")
+        if not has_request_context():
+            return
+
+        ctx_g = g._get_current_object()
+        ctx_g.query_count = ctx_g.get("query_count", 0) + 1
+        ctx_g.query_time = ctx_g.get("query_time", 0) + elapsed
+        shapes = ctx_g.get("query_shapes")
+        if shapes is None:
+            shapes = ctx_g.query_shapes = dict()
+        shape = _statement_shape(statement)
+        count = shapes[shape] = shapes.get(shape, 0) + 1
+        if count == self.repeat_threshold:     # 每个请求的每种语句只警告一次
+            self.app.logger.warning(f"疑似N+1查询：同一请求内重复执行{count}次，{self.call_site()}, {' '.join(shape.split())}")
+
+    def call_site(self):
+        """返回项目代码中最内层的调用位置，只在需要记录日志时调用"""
+        frame = sys._getframe(1)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(self.root_path) and filename != __file__ and os.sep + "site-packages" + os.sep not in filename:
+                return f"{filename[len(self.root_path):]}:{frame.f_lineno}({frame.f_code.co_name})"
+            frame = frame.f_back
+        return "unknown"
+
+    @staticmethod
+    def _after_request(response):
+        response.headers["X-DB-Query-Count"] = str(g.get("query_count", 0))
+        response.headers["X-DB-Query-Time"] = f"{g.get('query_time', 0) * 1000:.2f}ms"
+        return response
@@ -8,8 +8,14 @@
 import json
 import decimal
 from datetime import date, time, datetime
+from functools import lru_cache
 
-from flask import Response
+from flask import Response, current_app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 GLOBAL_REQUEST_PARAM_LIST = {
@@ -68,19 +74,87 @@ GLOBAL_RESPONSE_CODE_LIST = {
 }
 
 
+def json_default(obj):
+    """日期时间按原有格式输出，不带时区的用isoformat代替strftime"""
+    if isinstance(obj, datetime):
+        return obj.isoformat(" ", "seconds") if obj.tzinfo is None else obj.strftime("%Y-%m-%d %H:%M:%S")
+    elif isinstance(obj, date):
+        return obj.isoformat()
+    elif isinstance(obj, time):
+        return obj.isoformat("seconds") if obj.tzinfo is None else obj.strftime('%H:%M:%S')
+    elif isinstance(obj, decimal.Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
 class JsonEncoder(json.JSONEncoder):
     def default(self, obj):
-        if isinstance(obj, datetime):
-            return obj.strftime("%Y-%m-%d %H:%M:%S")
-        elif isinstance(obj, date):
-            return obj.strftime("%Y-%m-%d")
-        elif isinstance(obj, time):
-            return obj.strftime('%H:%M:%S')
-        elif isinstance(obj, decimal.Decimal):
-            return float(obj)
-        else:
+        try:
+            return json_default(obj)
+        except TypeError:
             return super().default(obj)
 
 
+_json_dumps = json.JSONEncoder(default=json_default, separators=(",", ":")).encode
+
+
+@lru_cache(maxsize=None)
+def get_json_dumps(name):
+    """
+    返回json编码函数，可选orjson、json，orjson未安装时使用json
+    orjson输出UTF-8字节，日期时间交给json_default保持原有格式，编码失败（如超出64位的整数）时改用json
+    """
+    if name == "orjson" and orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+        def dumps(data):
+            try:
+                return orjson.dumps(data, default=json_default, option=option)
+            except TypeError:
+                return _json_dumps(data)
+        return dumps
+    return _json_dumps
+
+
+def json_dumps(data):
+    return get_json_dumps(current_app.config.get("RESPONSE_JSON_ENCODER", "json"))(data)
+
+
 def json_return(data):
-    return Response(json.dumps(data, cls=JsonEncoder, separators=(",", ":")), mimetype="application/json")
+    return Response(json_dumps(data), mimetype="application/json")
+
+
+class ResponseCodes(object):
+    """蓝图的返回码表，缓存固定的返回内容，如参数错误、token错误"""
+    def __init__(self, table, max_bodies=256):
+        self.table = table
+        self.max_bodies = max_bodies
+        self.bodies = dict()        # (返回码名称, 提示信息, data) -> 编码后的返回内容
+
+    def body(self, code, msg, data, dumps, static=False):
+        """
+        返回编码后的返回内容
+        static为True表示内容只由返回码和固定的提示信息决定（如参数错误、token错误），此时缓存编码结果，缓存数量达到上限后不再增加
+        """
+        result = {"code": self.table[code][0], "msg": msg, "data": "" if data is None else data}
+        if not static:
+            return dumps(result)
+        try:
+            key = (code, msg, tuple(data.items()) if isinstance(data, dict) else data)
+            body = self.bodies.get(key)
+        except TypeError:   # data不可哈希时不缓存
+            return dumps(result)
+        if body is None:
+            body = dumps(result)
+            if len(self.bodies) < self.max_bodies:
+                self.bodies[key] = body
+        return body
+
+    @classmethod
+    def of(cls, blueprint, default_table, max_bodies=256):
+        """返回蓝图的返回码表，COMMON_RESPONSE_CODE_LIST被替换后重新生成"""
+        table = getattr(blueprint, "COMMON_RESPONSE_CODE_LIST", default_table)
+        codes = getattr(blueprint, "response_codes", None)
+        if codes is None or codes.table is not table:
+            codes = blueprint.response_codes = cls(table, max_bodies)
+        return codes
@@ -0,0 +1,197 @@
+# coding: utf-8
+"""
+参数校验
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+根据接口注释中的#param和params装饰器声明的格式，在加载接口时为每个接口编译参数校验函数，
+请求时一次遍历完成取值、类型转换和格式校验，结果保存在g.params
+"""
+import re
+import inspect
+from functools import wraps
+
+from flask import g
+
+from .doc import RE_DOC_PARAMS, RE_DOC_PARAM_FIELD
+from .tool import RE_EMAIL, RE_MOBILE, RE_PASSWORD, RE_SMS_CODE, is_date
+
+
+# 参数格式：格式名称 -> (校验函数, 默认返回码, 默认错误信息)
+PARAM_FORMATS = {
+    "mobile": (RE_MOBILE.search, "PARAM_MOBILE_ERROR", "手机号参数错误"),
+    "password": (RE_PASSWORD.search, "PARAM_FORMAT_ERROR", "密码参数错误"),
+    "sms_code": (RE_SMS_CODE.search, "PARAM_FORMAT_ERROR", "验证码参数错误"),
+    "email": (RE_EMAIL.search, "PARAM_EMAIL_ERROR", "邮箱参数错误"),
+    "date": (is_date, "PARAM_FORMAT_ERROR", "日期参数错误"),
+}
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ("1", "true", "yes"):
+            return True
+        if value in ("0", "false", "no", ""):
+            return False
+        raise ValueError(value)
+    return bool(value)
+
+
+# 参数类型转换，未列出的类型（如file、list）不做转换
+PARAM_TYPES = {
+    "str": lambda value: str(value).strip(),
+    "int": int,
+    "float": float,
+    "bool": _to_bool,
+}
+
+
+class ParamErr(Exception):
+    def __init__(self, name, desc="", **kwargs):
+        self.name = name
+        self.desc = desc
+        self.kwargs = kwargs
+
+
+def _compile_field(name, spec):
+    """生成单个参数的校验函数，只保留该参数用到的校验"""
+    convert = PARAM_TYPES.get(spec.get("type"))
+    required = spec.get("required", True)
+    default = spec.get("default")
+    check, code, msg = PARAM_FORMATS.get(spec.get("format"), (None, "PARAM_ERROR", f"参数错误：{name}"))
+    code, msg = spec.get("error", (code, msg))
+    choices = spec.get("choices")
+    min_len = spec.get("min_len")
+    max_len = spec.get("max_len")
+
+    def check_field(data, params):
+        value = data.get(name)
+        if value is None:
+            if required:    # 有格式要求的参数缺少时按格式错误返回
+                raise ParamErr(code, msg, field=name) if check else ParamErr("PARAM_NOT_FOUND", f"缺少参数：{name}", field=name)
+            params[name] = default
+            return
+        if convert is not None:
+            try:
+                value = convert(value)
+            except (TypeError, ValueError):
+                raise ParamErr("PARAM_TYPE_ERROR", f"参数类型错误：{name}", field=name)
+        if check is not None and not check(value):
+            raise ParamErr(code, msg, field=name)
+        if choices is not None and value not in choices:
+            raise ParamErr(code, msg, field=name)
+        if isinstance(value, str) and (min_len is not None and len(value) < min_len or max_len is not None and len(value) > max_len):
+            raise ParamErr(code, msg, field=name)
+        params[name] = value
+    return check_field
+
+
+def compile_validator(func, schema=None):
+    """
+    合并接口注释中的#param和显式声明的格式，生成参数校验函数
+    :param func: 接口函数
+    :param schema: 参数名 -> 格式名称，或包含type、required、format、error、choices、min_len、max_len、default的字典，
+                   min_len、max_len只对字符串类型的参数生效
+    :return: 校验函数，接口没有需要校验的参数时返回None
+    """
+    fields = dict()
+    for p in RE_DOC_PARAMS.findall(func.__doc__ or ""):
+        p_match = RE_DOC_PARAM_FIELD.match(p)
+        if p_match:
+            p_name, p_type, p_option = p_match.group(1, 2, 3)
+            fields[p_name] = {"type": (p_type or "str").strip(), "required": (p_option or "必需").strip() != "可选"}
+    for p_name, spec in (schema or dict()).items():
+        spec = {"format": spec} if isinstance(spec, str) else spec
+        fields.setdefault(p_name, {"type": "str", "required": True}).update(spec)
+
+    # 文件参数从request.files读取，多级字段交给接口自己处理
+    checks = [_compile_field(p_name, spec) for p_name, spec in fields.items()
+              if spec["type"] != "file" and "." not in p_name and "[" not in p_name]
+    if not checks:
+        return None
+
+    def validate(data):
+        result = dict()
+        for check in checks:
+            check(data, result)
+        return result
+    return validate
+
+
+def params(**schema):
+    """
+    声明参数格式，加载接口时与注释中的#param合并编译，校验通过后参数保存在g.params，失败时抛出ParamErr
+    放在最内层，先完成need_login等权限校验再校验参数
+    """
+    def decorator(func):
+        validator = compile_validator(func, schema)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            g.params = validator(g.request_data) if validator is not None else dict()
+            return func(*args, **kwargs)
+        wrapper.param_validator = validator
+        return wrapper
+    return decorator
+
+
+EMPTY_PARAM_LIST = dict()
+
+
+class CommonParams(object):
+    """蓝图公共参数表编译后的校验器"""
+    def __init__(self, table):
+        self.table = table
+        self.fields = [(name, p.get("required"), re.compile(p["reg"]).search if p.get("reg") else bool) for name, p in table.items()]
+
+    def __call__(self, data):
+        """校验并返回公共参数，必需的参数不符合格式时抛出ParamErr"""
+        values = dict()
+        for name, required, search in self.fields:
+            value = data.get(name)
+            value = "" if value is None else str(value).strip()
+            if required and not search(value):
+                raise ParamErr("PARAM_ERROR", f"公共参数错误：{name}", field=name)
+            values[name] = value
+        return values
+
+    @classmethod
+    def of(cls, blueprint):
+        """返回蓝图的公共参数校验器，COMMON_REQUEST_PARAM_LIST被替换后重新编译"""
+        table = getattr(blueprint, "COMMON_REQUEST_PARAM_LIST", EMPTY_PARAM_LIST)
+        validator = getattr(blueprint, "common_param_validator", None)
+        if validator is None or validator.table is not table:
+            validator = blueprint.common_param_validator = cls(table)
+        return validator
+
+
+class Schema(object):
+    def __init__(self, app=None, blueprint_names=None):
+        """为没有使用params装饰器、但注释中声明了#param的接口编译参数校验，blueprint_names不指定时处理所有接口"""
+        self.app = app
+        if app is not None:
+            self.init_app(app, blueprint_names)
+
+    def init_app(self, app, blueprint_names=None):
+        prefixes = tuple(f"{name}." for name in blueprint_names) if blueprint_names else None
+        for endpoint, func in list(app.view_functions.items()):
+            if endpoint == "static" or hasattr(func, "param_validator"):
+                continue
+            if prefixes and not endpoint.startswith(prefixes):
+                continue
+            validator = compile_validator(func)
+            if validator is None:
+                continue
+            if inspect.unwrap(func) is not func:
+                # 加在最外层会先于need_login等装饰器校验参数，这类接口需要在最内层使用params装饰器
+                app.logger.warning(f"接口{endpoint}使用了其他装饰器，未自动添加参数校验，请在最内层加上params装饰器")
+                continue
+            app.view_functions[endpoint] = self.wrap(func, validator)
+
+    @staticmethod
+    def wrap(func, validator):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            g.params = validator(g.request_data)
+            return func(*args, **kwargs)
+        wrapper.param_validator = validator
+        return wrapper
@@ -4,6 +4,7 @@
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 """
+import os
 import sys
 import re
 import decimal
@@ -15,6 +16,7 @@ import uuid
 import time
 import traceback
 from datetime import date, datetime
+from functools import lru_cache
 from dateutil.relativedelta import relativedelta
 from hashlib import sha512
 from random import choice
@@ -24,6 +26,22 @@ from math import radians, cos, asin, sqrt, sin
 from flask import request
 
 
+# 常用格式的正则，预先编译，参数校验时直接使用
+RE_EMAIL = re.compile(r"^\w+([\.-]?\w+)*@\w+([\.-]?\w+)*(\.\w{2,3})+$")
+RE_URL = re.compile(r"^((ht|f)tps?):\/\/[\w\-]+(\.[\w\-]+)+([\w\-\.,@?^=%&:\/~\+#]*[\w\-\@?^=%&\/~\+#])?$")
+RE_PHONE = re.compile(r"^(0[0-9]{2,3}\-?)?([2-9][0-9]{6,7})+(\-[0-9]{1,4})?$")
+RE_MOBILE_CN = re.compile(r"^1\d{10}$")
+RE_MOBILE_HK = re.compile(r"^(6|9)\d{7}$")
+RE_MOBILE_MO = re.compile(r"^6\d{6}$")
+RE_MOBILE_TW = re.compile(r"^9\d{8}$")
+RE_MOBILE = re.compile(r"^(1\d{10}|(6|9)\d{7}|6\d{6}|9\d{8})$")     # 内地、香港、澳门、台湾手机号
+RE_DATE = re.compile(r"^(1\d{3}|2\d{3})[-/.]{1}(0?\d|1[0-2]{1})[-/.]{1}(0?\d|[12]{1}\d|3[01]{1})$")
+RE_DATE_SEP = re.compile(r"[/.]")
+RE_TIME = re.compile(r"^(0?\d|1\d|2[0-3]{1})[:-]{1}(0?\d|[1-5]{1}\d)[:-]{1}(0?\d|[1-5]{1}\d)$")
+RE_PASSWORD = re.compile(r"^[\w.-~@#$%^&*]{6,16}$")
+RE_SMS_CODE = re.compile(r"^[a-zA-Z0-9]{6}$")
+
+
 def is_blank(var):
     return not (var and var.strip())
 
@@ -31,65 +49,57 @@ def is_blank(var):
 def is_email(var):
     if var is None:
         return False
-    regexp = r"^\w+([\.-]?\w+)*@\w+([\.-]?\w+)*(\.\w{2,3})+$"
-    return re.search(regexp, str(var))
+    return RE_EMAIL.search(str(var))
 
 
 def is_url(var):
     if var is None:
         return False
-    regexp = r"^((ht|f)tps?):\/\/[\w\-]+(\.[\w\-]+)+([\w\-\.,@?^=%&:\/~\+#]*[\w\-\@?^=%&\/~\+#])?$"
-    return re.search(regexp, str(var))
+    return RE_URL.search(str(var))
 
 
 def is_phone(var):
     if var is None:
         return False
-    regexp = r"^(0[0-9]{2,3}\-?)?([2-9][0-9]{6,7})+(\-[0-9]{1,4})?$"
-    return re.search(regexp, str(var))
+    return RE_PHONE.search(str(var))
 
 
 def is_mobile(var):
     if var is None:
         return False
-    return is_mobile_cn(var) or is_mobile_hk(var) or is_mobile_mo(var) or is_mobile_tw(var)
+    return RE_MOBILE.search(str(var))
 
 
 def is_mobile_cn(var):
     if var is None:
         return False
-    regexp = r"^1\d{10}$"
-    return re.search(regexp, str(var))
+    return RE_MOBILE_CN.search(str(var))
 
 
 def is_mobile_hk(var):
     if var is None:
         return False
-    regexp = r"^(6|9)\d{7}$"
-    return re.search(regexp, str(var))
+    return RE_MOBILE_HK.search(str(var))
 
 
 def is_mobile_mo(var):
     if var is None:
         return False
-    regexp = r"^6\d{6}$"
-    return re.search(regexp, str(var))
+    return RE_MOBILE_MO.search(str(var))
 
 
 def is_mobile_tw(var):
     if var is None:
         return False
-    regexp = r"^9\d{8}$"
-    return re.search(regexp, str(var))
+    return RE_MOBILE_TW.search(str(var))
 
 
 def is_date(var):
     if var is None:
         return False
-    regexp = r"^(1\d{3}|2\d{3})[-/.]{1}(0?\d|1[0-2]{1})[-/.]{1}(0?\d|[12]{1}\d|3[01]{1})$"
-    if re.search(regexp, str(var)):
+    if RE_DATE.search(str(var)):
         try:
-            return datetime.strptime(re.sub(r'[/.]', '-', str(var)), '%Y-%m-%d')
+            return datetime.strptime(RE_DATE_SEP.sub('-', str(var)), '%Y-%m-%d')
         except ValueError:    # 防止出现2018.06.31这种错误
             return False
     else:
@@ -99,8 +109,7 @@ def is_date(var):
 def is_time(var):
     if var is None:
         return False
-    regexp = r"^(0?\d|1\d|2[0-3]{1})[:-]{1}(0?\d|[1-5]{1}\d)[:-]{1}(0?\d|[1-5]{1}\d)$"
-    return re.search(regexp, str(var))
+    return RE_TIME.search(str(var))
 
 
 def is_datetime(var):
@@ -116,15 +125,13 @@ def is_datetime(var):
 def is_password(var):
     if var is None:
         return False
-    regexp = r"^[\w.-~@#$%^&*]{6,16}$"
-    return re.search(regexp, str(var))
+    return RE_PASSWORD.search(str(var))
 
 
 def is_sms_code(var):
     if var is None:
         return False
-    regexp = r"^[a-zA-Z0-9]{6}$"
-    return re.search(regexp, str(var))
+    return RE_SMS_CODE.search(str(var))
 
 
 def get_error_info():
@@ -163,7 +170,12 @@ def get_remote_addr():
 
 def get_client_ident(var=None):
     """获取客户端标识"""
-    user_agent = request.headers.get('User-Agent')
+    return _client_ident(var, request.headers.get('User-Agent'))
+
+
+@lru_cache(maxsize=4096)
+def _client_ident(var, user_agent):
+    """按(客户端信息, User-Agent)缓存标识摘要，避免每个请求都重新计算sha512"""
     if user_agent is not None:
         user_agent = user_agent.encode('utf-8')
     if var is None or var == "":
@@ -175,6 +187,28 @@ def get_client_ident(var=None):
     return h.hexdigest()
 
 
+# run_in_threadpool使用的gevent线程池，首次使用时在各工作进程中创建
+_threadpool = None
+_threadpool_pid = None
+
+
+def run_in_threadpool(func, args=(), kwargs=None, pool_size=None):
+    """
+    在线程池中执行耗CPU的函数（如密码哈希），等待期间其他协程继续运行
+    使用独立的线程池，不占用hub线程池中DNS解析等其他阻塞操作的线程；不在gevent协程中时直接执行
+    :param pool_size: 线程池的最大线程数，只在创建线程池时生效
+    """
+    global _threadpool, _threadpool_pid
+    gevent = sys.modules.get("gevent")
+    if gevent is not None and isinstance(gevent.getcurrent(), gevent.Greenlet):
+        if _threadpool is None or _threadpool_pid != os.getpid():
+            from gevent.threadpool import ThreadPool
+            _threadpool = ThreadPool(pool_size or 4)
+            _threadpool_pid = os.getpid()
+        return _threadpool.apply(func, args, kwargs)
+    return func(*args, **(kwargs or {}))
+
+
 def get_age(born, today=None):
     """计算年龄"""
     if isinstance(born, datetime):